@@ -0,0 +1,61 @@
+# agents/profile_features.py
+"""
+Feature dict of a profil, shared by the recommendation agent and the
+offline prototype builder (same vector space on both sides).
+Diplomas, skills and soft skills are keyed by their interned label id
+(scoring/labels.py), e.g. comp_12 — decode with feature_label().
+"""
+
+from scoring.labels import intern, encode, dedupe_competences, label_of
+
+FEATURE_KINDS = {"diplome_": "niveau_etude", "comp_": "competence", "soft_": "soft_skill"}
+
+# Fields read by vectorize_profile (+ what the neighbours list shows)
+OPTIMAL_FIELDS = {
+    "id_demandeur": 1, "full_te": 1, "diplomes": 1, "competences_techniques": 1, "comp_ids": 1,
+    "soft_skills": 1, "soft_ids": 1, "experiences": 1, "langues": 1
+}
+
+def vectorize_profile(profil):
+    features = {}
+    
+    # Diplomas
+    for d in profil.get("diplomes", []):
+        niveau_id = d.get("niveau_id")
+        if niveau_id is None and d.get("niveau"):
+            niveau_id = intern("niveau_etude", d["niveau"])
+        if niveau_id is not None:
+            features[f"diplome_{niveau_id}"] = 1
+    
+    # Tech skills (ids already set by the migration, interned otherwise)
+    comps = profil.get("competences_techniques", [])
+    if "comp_ids" not in profil:
+        comps = dedupe_competences(comps)
+    for c in comps:
+        features[f"comp_{c['id']}"] = c.get("etoiles") or 0
+    
+    # Soft skills
+    soft_ids = profil.get("soft_ids")
+    if soft_ids is None:
+        soft_ids = encode("soft_skill", profil.get("soft_skills", []))
+    for s in soft_ids:
+        features[f"soft_{s}"] = 1
+    
+    # Experience
+    max_months = max((e.get("duree_mois", 0) for e in profil.get("experiences", [])), default=0)
+    features["experience_months"] = max_months
+    
+    # Languages
+    level_map = {"Natif": 5, "Courant": 4, "Intermédiaire": 3, "Élémentaire": 2, "Aucun": 0}
+    for l in profil.get("langues", []):
+        langue = l.get("langue", "unknown").replace(" ", "_")
+        features[f"lang_{langue}"] = level_map.get(l.get("niveau", ""), 0)
+    
+    return features
+
+def feature_label(feature: str) -> str:
+    """Human label of an id-keyed feature (comp_12 → "Python")"""
+    for prefix, kind in FEATURE_KINDS.items():
+        if feature.startswith(prefix):
+            return label_of(kind, int(feature[len(prefix):]))
+    return feature
@@ -0,0 +1,217 @@
+# agents/prototypes.py
+"""
+Prototypes des profils optimaux (étape offline de l'Agent 2).
+Run: python -m agents.prototypes [n_probe]
+
+Pour chaque CSP (et pour l'ensemble global de fallback), les profils optimaux
+sont regroupés par MiniBatchKMeans; on stocke les centroïdes dans
+optimal_prototypes et le numéro de cluster de chaque membre sur son profil
+(proto.csp pour le scope CSP, proto.all pour le scope global).
+À la requête: similarité avec les centroïdes, puis comparaison exacte
+uniquement avec les membres des n_probe clusters les plus proches, lus par
+index sur profils. Les scopes devenus trop obsolètes sont reconstruits à la
+fin de chaque run de scoring (rebuild_stale_prototypes).
+"""
+
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import os
+import math
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.preprocessing import normalize
+from scoring.optimal_set import OPTIMAL_THRESHOLD, ALL_CSP, get_optimal_versions
+from scoring.tables import get_tables
+from agents.profile_features import vectorize_profile, OPTIMAL_FIELDS
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+PROTOTYPES_COLLECTION = "optimal_prototypes"
+MIN_OPTIMAL_PER_CSP = 5     # below this the agent falls back to all CSPs
+MAX_CLUSTERS = 256
+N_PROBE = 3                 # clusters refined at query time
+MAX_STALE_FRACTION = 0.2    # threshold crossings since the build, as a share of n_members, before
+                            # prototypes are ignored (rebuilt at the end of each scoring run)
+WRITE_BATCH = 1000
+
+# Query-time projection: never the member lists
+PROTOTYPE_FIELDS = {"n_members": 1, "optimal_version": 1, "feature_names": 1, "centroids": 1}
+
+def cluster_field(scope: str) -> str:
+    """Field of profils holding the member's cluster for this scope"""
+    return "proto.all" if scope == ALL_CSP else "proto.csp"
+
+def scope_query(scope: str) -> dict:
+    query = {"full_te": {"$gte": OPTIMAL_THRESHOLD}}
+    if scope != ALL_CSP:
+        query["csp"] = scope
+    return query
+
+# ────────────────────────────────────────────────
+# BUILD (offline)
+# ────────────────────────────────────────────────
+
+def choose_k(n: int) -> int:
+    return max(1, min(MAX_CLUSTERS, int(math.sqrt(n))))
+
+def build_prototypes(scope: str, versions: dict = None, seed: int = 42) -> dict:
+    versions = versions if versions is not None else get_optimal_versions()
+    profiles = list(db.profils.find(scope_query(scope), OPTIMAL_FIELDS))
+    doc = {
+        "_id": scope,
+        "n_members": len(profiles),
+        "optimal_version": versions.get(scope, 0),
+        "built_at": datetime.now(timezone.utc),
+        "feature_names": [],
+        "centroids": [],
+        "cluster_sizes": []
+    }
+
+    if len(profiles) >= MIN_OPTIMAL_PER_CSP or (scope == ALL_CSP and profiles):
+        vectorizer = DictVectorizer(sparse=False)
+        X = normalize(vectorizer.fit_transform([vectorize_profile(p) for p in profiles]))
+        k = choose_k(len(profiles))
+        kmeans = MiniBatchKMeans(n_clusters=k, batch_size=1024, n_init=3, random_state=seed)
+        labels = kmeans.fit_predict(X)
+
+        doc["feature_names"] = [str(f) for f in vectorizer.get_feature_names_out()]
+        doc["centroids"] = normalize(kmeans.cluster_centers_).tolist()
+        doc["cluster_sizes"] = np.bincount(labels, minlength=k).tolist()
+    else:
+        labels = []
+
+    # cluster membership lives on the profils (previous build's ids removed first)
+    field = cluster_field(scope)
+    stale = {field: {"$exists": True}}
+    if scope != ALL_CSP:
+        stale["csp"] = scope
+    db.profils.update_many(stale, {"$unset": {field: ""}})
+    ops = [UpdateOne({"_id": p["_id"]}, {"$set": {field: int(c)}}) for p, c in zip(profiles, labels)]
+    for start in range(0, len(ops), WRITE_BATCH):
+        db.profils.bulk_write(ops[start:start + WRITE_BATCH], ordered=False)
+
+    db[PROTOTYPES_COLLECTION].replace_one({"_id": scope}, doc, upsert=True)
+    return doc
+
+def build_all_prototypes():
+    versions = get_optimal_versions()
+    for scope in list(get_tables()["csp_categories"]) + [ALL_CSP]:
+        doc = build_prototypes(scope, versions)
+        print(f"  {scope}: {doc['n_members']} optimaux → {len(doc['centroids'])} clusters")
+
+def is_stale(doc: dict, versions: dict, fraction: float = MAX_STALE_FRACTION) -> bool:
+    crossings = versions.get(doc["_id"], 0) - doc["optimal_version"]
+    return crossings > fraction * max(doc["n_members"], 1)
+
+def rebuild_stale_prototypes(fraction: float = MAX_STALE_FRACTION) -> list:
+    """Rebuild the scopes whose optimal set moved (called at the end of scoring runs)"""
+    versions = get_optimal_versions()
+    rebuilt = []
+    for scope in list(get_tables()["csp_categories"]) + [ALL_CSP]:
+        doc = db[PROTOTYPES_COLLECTION].find_one({"_id": scope}, {"n_members": 1, "optimal_version": 1})
+        if doc is None or is_stale(doc, versions, fraction):
+            build_prototypes(scope, versions)
+            rebuilt.append(scope)
+    if rebuilt:
+        print(f"Prototypes reconstruits: {', '.join(rebuilt)}")
+    return rebuilt
+
+# ────────────────────────────────────────────────
+# QUERY
+# ────────────────────────────────────────────────
+
+def load_prototypes(scope: str, versions: dict):
+    """Prototype doc of the scope, or None if missing / too stale"""
+    doc = db[PROTOTYPES_COLLECTION].find_one({"_id": scope}, PROTOTYPE_FIELDS)
+    if not doc:
+        return None
+    if is_stale(doc, versions):
+        return None
+    return doc
+
+def to_prototype_space(profil, feature_names):
+    index = {f: i for i, f in enumerate(feature_names)}
+    vec = np.zeros(len(feature_names))
+    for f, v in vectorize_profile(profil).items():
+        if f in index:
+            vec[index[f]] = v
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+def prototype_candidates(current, doc, n_probe: int = N_PROBE):
+    """Members of the n_probe closest clusters that are still optimal"""
+    centroids = np.array(doc["centroids"])
+    sims = centroids @ to_prototype_space(current, doc["feature_names"])
+    closest = [int(c) for c in np.argsort(sims)[::-1][:n_probe]]
+    query = scope_query(doc["_id"])
+    query[cluster_field(doc["_id"])] = {"$in": closest}
+    return list(db.profils.find(query, OPTIMAL_FIELDS))
+
+def find_candidates(current, versions: dict, n_probe: int = N_PROBE):
+    """
+    Same scope rule as the exhaustive search (CSP, or all CSPs if fewer than
+    MIN_OPTIMAL_PER_CSP optimaux) → (candidates, scope), or (None, None) when
+    no usable prototypes exist and the caller must search exhaustively.
+    """
+    doc = load_prototypes(current["csp"], versions)
+    if doc is None:
+        return None, None
+    scope = current["csp"]
+    if doc["n_members"] < MIN_OPTIMAL_PER_CSP:
+        doc = load_prototypes(ALL_CSP, versions)
+        if doc is None:
+            return None, None
+        scope = ALL_CSP
+    if not doc["centroids"]:
+        return [], scope
+    return prototype_candidates(current, doc, n_probe), scope
+
+# ────────────────────────────────────────────────
+# EVALUATION: recall@10 vs exhaustive search
+# ────────────────────────────────────────────────
+
+def recall_at_10(csp: str, n_probe: int = N_PROBE, sample_size: int = 50) -> float:
+    from agents.recommendation_agent import (
+        compute_recommendations, compute_recommendations_streaming, optimal_query
+    )
+
+    versions = get_optimal_versions()
+    queries = list(db.profils.aggregate([
+        {"$match": {"csp": csp, "full_te": {"$lt": OPTIMAL_THRESHOLD}}},
+        {"$sample": {"size": sample_size}}
+    ]))
+    query, _ = optimal_query(csp)
+    if not queries or db.profils.count_documents(query, limit=1) == 0:
+        return float("nan")
+
+    recalls = []
+    for current in queries:
+        exhaustive = compute_recommendations_streaming(current, db.profils.find(query, OPTIMAL_FIELDS))
+        exact = {n["id_demandeur"] for n in exhaustive["neighbors"]}
+        candidates, _ = find_candidates(current, versions, n_probe)
+        if not candidates:
+            recalls.append(0.0)
+            continue
+        approx = {n["id_demandeur"] for n in compute_recommendations(current, candidates)["neighbors"]}
+        recalls.append(len(exact & approx) / len(exact))
+    return float(np.mean(recalls))
+
+
+if __name__ == "__main__":
+    import sys
+    n_probe = int(sys.argv[1]) if len(sys.argv) > 1 else N_PROBE
+
+    print("Construction des prototypes...")
+    build_all_prototypes()
+
+    print(f"\nRecall@10 vs recherche exhaustive (n_probe={n_probe}):")
+    for csp in get_tables()["csp_categories"]:
+        recall = recall_at_10(csp, n_probe)
+        db[PROTOTYPES_COLLECTION].update_one(
+            {"_id": csp}, {"$set": {f"recall_at_10.{n_probe}": recall}}
+        )
+        print(f"  {csp}: {recall:.3f}")
@@ -10,71 +10,86 @@ import os
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction import DictVectorizer
 import numpy as np
+import heapq
+from scoring.optimal_set import OPTIMAL_THRESHOLD, ALL_CSP
+from agents.profile_features import vectorize_profile, feature_label, OPTIMAL_FIELDS
+from agents.recommendation_cache import load_profile_with_cache, is_fresh, store_recommendations
+from agents.prototypes import find_candidates
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]
 
-OPTIMAL_THRESHOLD = 70.0
+TOP_K = 10
+STREAM_CHUNK_SIZE = 1000  # optimal profiles vectorized at a time in streaming mode
 
-def vectorize_profile(profil):
-    features = {}
-    
-    # Diplomas
-    for d in profil.get("diplomes", []):
-        niveau = d.get("niveau", "none").replace(" ", "_").replace("+", "plus")
-        features[f"diplome_{niveau}"] = 1
-    
-    # Tech skills
-    for c in profil.get("competences_techniques", []):
-        nom = c.get("nom", "unknown").replace(" ", "_")
-        features[f"comp_{nom}"] = c.get("etoiles", 0)
-    
-    # Soft skills
-    for s in profil.get("soft_skills", []):
-        features[f"soft_{s.replace(' ', '_')}"] = 1
-    
-    # Experience
-    max_months = max((e.get("duree_mois", 0) for e in profil.get("experiences", [])), default=0)
-    features["experience_months"] = max_months
-    
-    # Languages
-    level_map = {"Natif": 5, "Courant": 4, "Intermédiaire": 3, "Élémentaire": 2, "Aucun": 0}
-    for l in profil.get("langues", []):
-        langue = l.get("langue", "unknown").replace(" ", "_")
-        features[f"lang_{langue}"] = level_map.get(l.get("niveau", ""), 0)
-    
-    return features
-
-def compare_to_all_optimal(profil_id: str):
-    current = db.profils.find_one({"id_demandeur": profil_id})
-    if not current:
-        print("Profil non trouvé")
-        return
-    
-    if current.get("full_te", 0) >= OPTIMAL_THRESHOLD:
-        print("Profil déjà optimal — aucune recommandation nécessaire")
-        return
-    
-    csp = current["csp"]
-    
-    # All optimal in same CSP
-    optimal_profiles = list(db.profils.find({
-        "csp": csp,
-        "full_te": {"$gte": OPTIMAL_THRESHOLD}
-    }))
+def optimal_query(csp: str):
+    """Query of the optimal set to compare with: same CSP, or all CSPs if fewer than 5 → (query, scope)"""
+    query = {"csp": csp, "full_te": {"$gte": OPTIMAL_THRESHOLD}}
+    n_same_csp = db.profils.count_documents(query, limit=5)
     
     # Fallback if few
-    if len(optimal_profiles) < 5:
-        print(f"Seulement {len(optimal_profiles)} optimaux dans le même CSP — comparaison avec tous les optimaux")
-        optimal_profiles = list(db.profils.find({
-            "full_te": {"$gte": OPTIMAL_THRESHOLD}
-        }))
-    
-    if not optimal_profiles:
-        print("Aucun profil optimal trouvé")
-        return
+    if n_same_csp < 5:
+        print(f"Seulement {n_same_csp} optimaux dans le même CSP — comparaison avec tous les optimaux")
+        return {"full_te": {"$gte": OPTIMAL_THRESHOLD}}, ALL_CSP
     
+    return query, csp
+
+def find_optimal_profiles(csp: str):
+    """Optimal profiles loaded in memory → (profiles, scope)"""
+    query, scope = optimal_query(csp)
+    return list(db.profils.find(query, OPTIMAL_FIELDS)), scope
+
+def iter_chunks(cursor, size: int):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def build_prescriptions(gap_features):
+    prescriptions = []
+    for feature, strength in gap_features[:6]:
+        if feature.startswith("diplome_"):
+            prescriptions.append(f"Obtenir un {feature_label(feature)}")
+        elif feature.startswith("comp_"):
+            prescriptions.append(f"Améliorer la compétence {feature_label(feature)} (viser 4-5 étoiles)")
+        elif feature.startswith("soft_"):
+            prescriptions.append(f"Développer la compétence comportementale {feature_label(feature)}")
+        elif feature == "experience_months":
+            prescriptions.append("Gagner plus d'expérience professionnelle")
+        elif feature.startswith("lang_"):
+            lang = feature.replace("lang_", "").replace("_", " ")
+            prescriptions.append(f"Améliorer le niveau en {lang}")
+    return prescriptions
+
+def summarize(current_vec, feature_names, top_profiles, top_vecs, top_sims, n_optimal, avg_similarity):
+    """Gaps between the current profile and the mean of its top neighbours → cacheable dict"""
+    avg_top_vec = np.mean(top_vecs, axis=0)
+    gaps = avg_top_vec - current_vec
+    gap_features = [(str(feature_names[i]), float(gaps[i])) for i in range(len(gaps)) if gaps[i] > 0.5]
+    gap_features.sort(key=lambda x: x[1], reverse=True)
+    
+    return {
+        "n_optimal": n_optimal,
+        "avg_similarity": float(avg_similarity),
+        "neighbors": [
+            {
+                "id_demandeur": p["id_demandeur"],
+                "full_te": p.get("full_te"),
+                "similarity": float(sim)
+            }
+            for p, sim in zip(top_profiles, top_sims)
+        ],
+        "gaps": gap_features,
+        "prescriptions": build_prescriptions(gap_features)
+    }
+
+def compute_recommendations(current, optimal_profiles):
+    """Top 10 neighbours + gaps + prescriptions, all optimal profiles in memory"""
     # Vectorize all
     vectorizer = DictVectorizer(sparse=False)
     current_vec = vectorizer.fit_transform([vectorize_profile(current)])
@@ -83,52 +98,119 @@ def compare_to_all_optimal(profil_id: str):
     # Cosine similarity to ALL optimal
     similarities = cosine_similarity(current_vec, optimal_vecs)[0]
     
+    # Top 10 most similar
+    top_indices = np.argsort(similarities)[-TOP_K:][::-1]
+    
+    return summarize(
+        current_vec[0], vectorizer.get_feature_names_out(),
+        [optimal_profiles[i] for i in top_indices], optimal_vecs[top_indices], similarities[top_indices],
+        len(optimal_profiles), np.mean(similarities)
+    )
+
+def compute_recommendations_streaming(current, optimal_cursor, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Same result as compute_recommendations, reading the optimal profiles chunk by chunk:
+    running top-k min-heap + running sum for the mean similarity.
+    Peak memory = one chunk + k vectors, whatever the size of the optimal set.
+    """
+    # The vector space is the current profile's features, so it is fixed before streaming
+    vectorizer = DictVectorizer(sparse=False)
+    current_vec = vectorizer.fit_transform([vectorize_profile(current)])
+    
+    heap = []  # (similarity, seq, neighbour, vector) — heap[0] is the weakest of the top k
+    n_optimal, sim_sum, seq = 0, 0.0, 0
+    for chunk in iter_chunks(optimal_cursor, chunk_size):
+        vecs = vectorizer.transform([vectorize_profile(p) for p in chunk])
+        sims = cosine_similarity(current_vec, vecs)[0]
+        n_optimal += len(chunk)
+        sim_sum += float(sims.sum())
+        
+        # only the chunk's own top k can enter the global top k
+        for i in np.argsort(sims)[-TOP_K:]:
+            neighbour = {"id_demandeur": chunk[i]["id_demandeur"], "full_te": chunk[i].get("full_te")}
+            item = (float(sims[i]), seq, neighbour, vecs[i])
+            seq += 1
+            if len(heap) < TOP_K:
+                heapq.heappush(heap, item)
+            elif item[0] > heap[0][0]:
+                heapq.heapreplace(heap, item)
+    
+    if n_optimal == 0:
+        return None
+    
+    top = sorted(heap, key=lambda t: t[0], reverse=True)
+    return summarize(
+        current_vec[0], vectorizer.get_feature_names_out(),
+        [t[2] for t in top], np.array([t[3] for t in top]), [t[0] for t in top],
+        n_optimal, sim_sum / n_optimal
+    )
+
+def get_recommendations(profil_id: str, use_cache: bool = True, use_prototypes: bool = True,
+                        streaming: bool = True):
+    """
+    Returns (profil, reco) — reco is served from recommendation_cache when the
+    profile and the optimal set it was computed against have not changed.
+    With use_prototypes, only the members of the closest clusters are compared
+    (see agents/prototypes.py); exhaustive search if no prototypes are built or
+    the probed clusters have no optimal member left, streamed chunk by chunk
+    unless streaming=False.
+    """
+    current, cached, versions = load_profile_with_cache(profil_id)
+    if not current:
+        return None, {"error": "Profil non trouvé"}
+    
+    if current.get("full_te", 0) >= OPTIMAL_THRESHOLD:
+        return current, {"error": "Profil déjà optimal — aucune recommandation nécessaire"}
+    
+    if use_cache and is_fresh(cached, current, versions):
+        return current, {**cached, "from_cache": True}
+    
+    reco, approx = None, False
+    if use_prototypes:
+        candidates, scope = find_candidates(current, versions)
+        if candidates:
+            reco, approx = compute_recommendations(current, candidates), True
+    if not approx:  # no prototypes, or no optimal member left in the probed clusters
+        if streaming:
+            query, scope = optimal_query(current["csp"])
+            cursor = db.profils.find(query, OPTIMAL_FIELDS, batch_size=STREAM_CHUNK_SIZE)
+            reco = compute_recommendations_streaming(current, cursor)
+        else:
+            optimal_profiles, scope = find_optimal_profiles(current["csp"])
+            reco = compute_recommendations(current, optimal_profiles) if optimal_profiles else None
+    if reco is None:
+        return current, {"error": "Aucun profil optimal trouvé"}
+    
+    reco["prototypes"] = approx
+    store_recommendations(current, scope, versions, reco)
+    return current, {**reco, "from_cache": False}
+
+def compare_to_all_optimal(profil_id: str, use_cache: bool = True, use_prototypes: bool = True,
+                           streaming: bool = True):
+    current, reco = get_recommendations(profil_id, use_cache, use_prototypes, streaming)
+    if "error" in reco:
+        print(reco["error"])
+        return
+    
     # Stats
-    avg_similarity = np.mean(similarities)
-    print(f"\nSimilarité moyenne avec {len(optimal_profiles)} profils optimaux: {avg_similarity:.3f}")
+    source = " (cache)" if reco["from_cache"] else ""
+    if reco.get("prototypes"):
+        source += " (clusters les plus proches)"
+    print(f"\nSimilarité moyenne avec {reco['n_optimal']} profils optimaux: {reco['avg_similarity']:.3f}{source}")
     
-    # Top 10 most similar
-    top_indices = np.argsort(similarities)[-10:][::-1]
     print("\nTop 10 profils optimaux les plus similaires:")
-    for idx in top_indices:
-        neighbor = optimal_profiles[idx]
-        sim = similarities[idx]
-        print(f"  - {neighbor['id_demandeur']} (TE: {neighbor.get('full_te', 'N/A'):.1f}%) — similarité: {sim:.3f}")
-    
-    # Use top 10 for gaps/prescriptions
-    top_neighbors = [optimal_profiles[i] for i in top_indices]
-    avg_top_vec = np.mean(vectorizer.transform([vectorize_profile(p) for p in top_neighbors]), axis=0)
-    current_vec_flat = current_vec[0]
-    
-    gaps = avg_top_vec - current_vec_flat
-    feature_names = vectorizer.get_feature_names_out()
-    gap_features = [(feature_names[i], gaps[i]) for i in range(len(gaps)) if gaps[i] > 0.5]
-    gap_features.sort(key=lambda x: x[1], reverse=True)
-    
-    prescriptions = []
-    for feature, strength in gap_features[:6]:
-        if feature.startswith("diplome_"):
-            niveau = feature.replace("diplome_", "").replace("_", " ").replace("plus", "+")
-            prescriptions.append(f"Obtenir un {niveau}")
-        elif feature.startswith("comp_"):
-            comp = feature.replace("comp_", "").replace("_", " ")
-            prescriptions.append(f"Améliorer la compétence {comp} (viser 4-5 étoiles)")
-        elif feature.startswith("soft_"):
-            soft = feature.replace("soft_", "").replace("_", " ")
-            prescriptions.append(f"Développer la compétence comportementale {soft}")
-        elif feature == "experience_months":
-            prescriptions.append("Gagner plus d'expérience professionnelle")
-        elif feature.startswith("lang_"):
-            lang = feature.replace("lang_", "").replace("_", " ")
-            prescriptions.append(f"Améliorer le niveau en {lang}")
+    for neighbor in reco["neighbors"]:
+        print(f"  - {neighbor['id_demandeur']} (TE: {neighbor.get('full_te') or 0:.1f}%) — similarité: {neighbor['similarity']:.3f}")
     
     print(f"\nRecommandations pour {profil_id} ({current['csp']}):")
-    print(f"TE actuel: {current.get('full_te', 'N/A'):.1f}% → {current.get('te_classification', 'N/A')}")
-    if prescriptions:
-        for rec in prescriptions:
+    print(f"TE actuel: {current.get('full_te', 0):.1f}% → {current.get('te_classification', 'N/A')}")
+    if reco["prescriptions"]:
+        for rec in reco["prescriptions"]:
             print(f"• {rec}")
     else:
         print("• Profil déjà très proche des optimaux")
+    
+    return reco
 
 # Test on random low/medium TE
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+# agents/recommendation_cache.py
+"""
+Cache des recommandations (Agent 2), une entrée par profil.
+Une entrée est valide tant que:
+  - le profil n'a pas changé (updated_at identique)
+  - la version de l'ensemble optimal utilisé (CSP ou global) n'a pas bougé
+Lecture: un seul aggregate sur profils (match id_demandeur + 2 $lookup par _id).
+"""
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import os
+from scoring.optimal_set import VERSIONS_DOC_ID
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+CACHE_COLLECTION = "recommendation_cache"
+
+def profile_version(profil) -> datetime:
+    return profil.get("updated_at") or profil.get("created_at")
+
+def load_profile_with_cache(profil_id: str):
+    """
+    Returns (profil, cached_entry, optimal_versions) in one round-trip.
+    cached_entry is None when absent; validity is checked by is_fresh().
+    """
+    pipeline = [
+        {"$match": {"id_demandeur": profil_id}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": CACHE_COLLECTION,
+            "localField": "id_demandeur",
+            "foreignField": "_id",
+            "as": "_reco_cache"
+        }},
+        {"$lookup": {
+            "from": "optimal_versions",
+            "pipeline": [{"$match": {"_id": VERSIONS_DOC_ID}}],
+            "as": "_optimal_versions"
+        }},
+    ]
+    docs = list(db.profils.aggregate(pipeline))
+    if not docs:
+        return None, None, {}
+
+    profil = docs[0]
+    cache = profil.pop("_reco_cache")
+    versions = profil.pop("_optimal_versions")
+    versions = versions[0] if versions else {}
+    versions.pop("_id", None)
+    return profil, (cache[0] if cache else None), versions
+
+def is_fresh(entry, profil, versions) -> bool:
+    if not entry:
+        return False
+    return (
+        entry.get("updated_at") == profile_version(profil)
+        and entry.get("optimal_version") == versions.get(entry.get("scope"), 0)
+    )
+
+def store_recommendations(profil, scope: str, versions: dict, reco: dict):
+    """scope = CSP of the optimal set compared against, or ALL_CSP for the fallback"""
+    db[CACHE_COLLECTION].replace_one(
+        {"_id": profil["id_demandeur"]},
+        {
+            **reco,
+            "updated_at": profile_version(profil),
+            "scope": scope,
+            "optimal_version": versions.get(scope, 0),
+            "computed_at": datetime.now(timezone.utc)
+        },
+        upsert=True
+    )
+
+def invalidate(profil_id: str = None):
+    """Drop one entry (or all of them)"""
+    query = {"_id": profil_id} if profil_id else {}
+    return db[CACHE_COLLECTION].delete_many(query).deleted_count
@@ -3,26 +3,40 @@
 Agent 1: Pondération Dynamique
 Ajuste les poids Savoir / Savoir-faire / Savoir-être par CSP
 en se basant sur les placements réussis (duree_attente_jours faible = succès).
+
+Les poids validés (IC étroit) sont publiés comme nouvelle version dans
+dynamic_weights (scoring/tables.py) : les scorers les lisent via get_tables()
+et les CSP concernées sont mises en file pour un rescoring ciblé.
+update_weights() ne recalcule que si assez de nouveaux placements sont arrivés.
 """
 
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
-from scipy.stats import pearsonr  
+from datetime import datetime, timezone
 import numpy as np
-from scoring.resource_score import CSP_CATEGORIES
+from scoring.tables import get_tables, publish_dynamic_weights
+from scoring.market_counters import get_counters
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]
 
-# Poids initiaux (fallback si pas assez de data)
-DEFAULT_WEIGHTS = {
-    "Management": {"savoir": 45, "savoir_faire": 30, "savoir_etre": 25},
-    "Personnel professionnel": {"savoir": 33, "savoir_faire": 50, "savoir_etre": 17},
-    "Encadrement de support": {"savoir": 34, "savoir_faire": 33, "savoir_etre": 33},
-    "Personnel d'aide": {"savoir": 0, "savoir_faire": 100, "savoir_etre": 0},
-}
+PILLARS = ["savoir", "savoir_faire", "savoir_etre"]
+N_BOOTSTRAP = 2000
+CI_LEVEL = 0.95
+MAX_CI_WIDTH = 20.0                # points of weight; wider → weights not published
+BOOTSTRAP_MAX_CELLS = 20_000_000   # floats per vectorised block (~160 MB)
+MIN_NEW_PLACEMENTS = 50            # new placements needed before re-estimating a CSP
+
+# Poids initiaux (fallback si pas assez de data): weights_resources des referentiels
+def default_weights(csp: str):
+    return dict(get_tables()["referentiel_weights_resources"].get(csp, {"savoir": 33, "savoir_faire": 33, "savoir_etre": 34}))
+
+def active_weights(csp: str):
+    """Weights the scorers currently use for this CSP (dynamic if published)"""
+    tables = get_tables()
+    return dict(tables["weights_resources"][csp]), tables["weight_versions"].get(csp, 0)
 
 def get_placed_profiles(csp: str, min_placements=5):
     """
@@ -43,7 +57,7 @@ def get_placed_profiles(csp: str, min_placements=5):
             "$project": {
                 "id_demandeur": 1,
                 "duree_attente_jours": 1,
-                "savoir_norm": "$profil.resources.savoir_norm",      # assume you saved these after batch
+                "savoir_norm": "$profil.resources.savoir_norm",      # saved by scoring (full_te.score_fields)
                 "savoir_faire_norm": "$profil.resources.savoir_faire_norm",
                 "savoir_etre_norm": "$profil.resources.savoir_etre_norm"
             }
@@ -59,46 +73,140 @@ def get_placed_profiles(csp: str, min_placements=5):
     return results
 
 
-def compute_dynamic_weights(csp: str):
+def pearson_rows(y, X):
+    """
+    Pearson correlation of y with each column of X, row by row:
+    y (B, n), X (B, n, k) → (B, k). Zero variance → 0.
+    """
+    yc = y - y.mean(axis=1, keepdims=True)
+    Xc = X - X.mean(axis=1, keepdims=True)
+    num = np.einsum("bn,bnk->bk", yc, Xc)
+    den = np.sqrt(np.einsum("bn,bn->b", yc, yc)[:, None] * np.einsum("bnk,bnk->bk", Xc, Xc))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.where(den > 0, num / den, 0.0)
+    return corr
+
+def corr_to_weights(corrs):
+    """|corr| normalised to sum to 100 (rows with all-zero corr → NaN)"""
+    abs_corrs = np.abs(corrs)
+    total = abs_corrs.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, abs_corrs / total * 100, np.nan)
+
+def bootstrap_weights(success, subs, n_boot=N_BOOTSTRAP, seed=None):
+    """
+    Bootstrap of correlations + weights, vectorised over (B, n) index matrices.
+    Resamples are processed in blocks so memory stays under BOOTSTRAP_MAX_CELLS.
+    Returns (corrs (B, 3), weights (B, 3)).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(success)
+    block = max(1, BOOTSTRAP_MAX_CELLS // (n * subs.shape[1]))
+    corrs = []
+    for start in range(0, n_boot, block):
+        idx = rng.integers(0, n, size=(min(block, n_boot - start), n))
+        corrs.append(pearson_rows(success[idx], subs[idx]))
+    corrs = np.concatenate(corrs)
+    return corrs, corr_to_weights(corrs)
+
+def percentile_ci(samples, level=CI_LEVEL):
+    alpha = (1 - level) / 2 * 100
+    low, high = np.nanpercentile(samples, [alpha, 100 - alpha], axis=0)
+    return low, high
+
+def compute_dynamic_weights(csp: str, n_boot: int = N_BOOTSTRAP, seed=None, publish: bool = True):
+    """
+    Point estimate + bootstrap CI of the weights. The new weights are returned
+    (and, with publish=True, stored as a new dynamic_weights version) only if
+    every weight CI is narrower than MAX_CI_WIDTH; otherwise the weights
+    currently in use are kept. Each run is stored in weight_runs.
+    """
+    placements_seen = get_counters(csp)["duree_count"]
     placed = get_placed_profiles(csp)
     if placed is None:
-        return DEFAULT_WEIGHTS.get(csp, {"savoir": 33, "savoir_faire": 33, "savoir_etre": 34})
+        return active_weights(csp)[0]
     
     # Calcul success score : plus courte attente = meilleur
-    durees = np.array([p["duree_attente_jours"] for p in placed])
+    durees = np.array([p["duree_attente_jours"] for p in placed], dtype=float)
     max_duree = np.max(durees) if len(durees) > 0 else 180
     success_scores = 100 - (durees / max_duree * 100)  # 100 = très rapide
     
-    savoirs = np.array([p["savoir_norm"] for p in placed])
-    savoir_faires = np.array([p["savoir_faire_norm"] for p in placed])
-    savoir_etres = np.array([p["savoir_etre_norm"] for p in placed])
-    
-    # Corrélation de Pearson (plus fort = plus important)
-    corr_savoir, _ = pearsonr(success_scores, savoirs) if len(savoirs) > 1 else (0, 0)
-    corr_faire, _ = pearsonr(success_scores, savoir_faires) if len(savoir_faires) > 1 else (0, 0)
-    corr_etre, _ = pearsonr(success_scores, savoir_etres) if len(savoir_etres) > 1 else (0, 0)
+    subs = np.array([[p["savoir_norm"], p["savoir_faire_norm"], p["savoir_etre_norm"]] for p in placed], dtype=float)
     
-    # Prendre valeurs absolues (corrélation peut être négative)
-    corrs = np.abs([corr_savoir, corr_faire, corr_etre])
+    # Corrélation de Pearson (plus fort = plus important) — point estimate
+    corrs = pearson_rows(success_scores[None, :], subs[None, :, :])[0]
+    weights = corr_to_weights(corrs)
     
-    # Normaliser pour sommer à 100
-    if np.sum(corrs) == 0:
-        return DEFAULT_WEIGHTS[csp]  # fallback si corrélation nulle
+    # Bootstrap: B resamples in one vectorised pass
+    boot_corrs, boot_weights = bootstrap_weights(success_scores, subs, n_boot, seed)
+    corr_low, corr_high = percentile_ci(boot_corrs)
+    w_low, w_high = percentile_ci(boot_weights)
+    widths = w_high - w_low
+    tight = bool(np.all(np.isfinite(widths)) and np.max(widths) <= MAX_CI_WIDTH and np.all(np.isfinite(weights)))
     
-    weights_sum = np.sum(corrs)
-    new_weights = {
-        "savoir": round(corrs[0] / weights_sum * 100, 0),
-        "savoir_faire": round(corrs[1] / weights_sum * 100, 0),
-        "savoir_etre": round(corrs[2] / weights_sum * 100, 0)
+    run = {
+        "csp": csp,
+        "run_at": datetime.now(timezone.utc),
+        "n_placements": len(placed),
+        "placements_seen": placements_seen,   # placements counter at run time (update_weights gate)
+        "n_bootstrap": n_boot,
+        "ci_level": CI_LEVEL,
+        "published": tight,
+        "corr": dict(zip(PILLARS, map(float, corrs))),
+        "corr_ci": {k: [float(lo), float(hi)] for k, lo, hi in zip(PILLARS, corr_low, corr_high)},
+        "weights": dict(zip(PILLARS, (round(float(w), 0) if np.isfinite(w) else None for w in weights))),
+        "weights_ci": {k: [float(lo), float(hi)] for k, lo, hi in zip(PILLARS, w_low, w_high)},
     }
+    if tight and publish:
+        version = publish_dynamic_weights(
+            csp, run["weights"],
+            n_placements=len(placed),
+            weights_ci=run["weights_ci"],
+            run_at=run["run_at"],
+        )
+        if version is None:  # same weights as the active version
+            run["published"] = False
+        else:
+            run["weights_version"] = version
+    db.weight_runs.insert_one(run)
     
-    print(f"Nouveaux poids dynamiques pour {csp}: {new_weights}")
-    print(f"Basé sur {len(placed)} placements (corr savoir: {corr_savoir:.2f}, faire: {corr_faire:.2f}, etre: {corr_etre:.2f})")
+    print(f"Poids dynamiques pour {csp}: {run['weights']} (IC {CI_LEVEL:.0%}: "
+          + ", ".join(f"{k} [{lo:.0f}-{hi:.0f}]" for k, lo, hi in zip(PILLARS, w_low, w_high)) + ")")
+    print(f"Basé sur {len(placed)} placements (corr savoir: {corrs[0]:.2f}, faire: {corrs[1]:.2f}, etre: {corrs[2]:.2f})")
     
-    return new_weights
+    if not tight:
+        print(f"  → IC trop large (max {np.nanmax(widths):.0f} pts > {MAX_CI_WIDTH}) — poids actuels conservés")
+        return active_weights(csp)[0]
+    
+    if "weights_version" in run:
+        print(f"  → publiés (v{run['weights_version']}), {csp} en attente de rescoring")
+    elif publish:
+        print("  → identiques aux poids actifs — pas de nouvelle version")
+    return run["weights"]
+
+def update_weights(csp: str, min_new_placements: int = MIN_NEW_PLACEMENTS, **kwargs):
+    """
+    Re-estimate the CSP's weights only once min_new_placements placements
+    arrived since the last run (market_counters, no scan of placements).
+    Returns (weights, version) in use after the call.
+    """
+    last = db.weight_runs.find_one({"csp": csp}, {"placements_seen": 1}, sort=[("run_at", -1)])
+    seen = get_counters(csp)["duree_count"]
+    new = seen - (last or {}).get("placements_seen", 0)
+    if new < 0:  # counter went down (reseed / reconcile): count from zero again
+        new = seen
+    if last and new < min_new_placements:
+        print(f"{csp}: {new} nouveaux placements (< {min_new_placements}) — pas de recalcul")
+    else:
+        compute_dynamic_weights(csp, **kwargs)
+    return active_weights(csp)
 
 
-# Test rapide
 if __name__ == "__main__":
-    for csp in CSP_CATEGORIES:
-        compute_dynamic_weights(csp)
\ No newline at end of file
+    import sys
+    force = "--force" in sys.argv
+    for csp in get_tables()["csp_categories"]:
+        if force:
+            compute_dynamic_weights(csp)
+        else:
+            update_weights(csp)
\ No newline at end of file
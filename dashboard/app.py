@@ -0,0 +1,88 @@
+# dashboard/app.py
+"""
+Monitoring dashboard ANEM Employabilité.
+Run: streamlit run dashboard/app.py
+
+Reads only the small precomputed documents of dashboard_summary
+(refreshed by the batch job, see scoring/dashboard_summary.py):
+a page load = a handful of keyed reads, whatever the population size.
+"""
+
+import os
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+SUMMARY_COLLECTION = "dashboard_summary"
+SUMMARY_TTL_S = 300
+
+@st.cache_resource
+def get_db():
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    return client[os.getenv("DATABASE_NAME")]
+
+@st.cache_data(ttl=SUMMARY_TTL_S)
+def load_summary(key: str):
+    doc = get_db()[SUMMARY_COLLECTION].find_one({"_id": key})
+    if not doc:
+        return pd.DataFrame(), None
+    return pd.DataFrame(doc["data"]), doc["updated_at"]
+
+st.set_page_config(page_title="ANEM Employabilité", layout="wide")
+st.title("ANEM Employabilité — Monitoring")
+
+classification, updated_at = load_summary("classification")
+if classification.empty:
+    st.warning("Aucun résumé disponible — lancer python -m scoring.batch_scoring")
+    st.stop()
+st.caption(f"Dernière mise à jour: {updated_at:%Y-%m-%d %H:%M} UTC (cache {SUMMARY_TTL_S // 60} min)")
+
+# ── Classification ─────────────────────────────
+st.header("Répartition des classifications")
+csps = sorted(classification["csp"].dropna().unique())
+selected = st.multiselect("CSP", csps, default=csps)
+filtered = classification[classification["csp"].isin(selected)]
+
+cols = st.columns(4)
+totals = filtered.groupby("classification")["count"].sum()
+for col, label in zip(cols, ["Employabilité Optimale", "Employabilité moyenne",
+                             "Employabilité faible", "Employabilité nulle"]):
+    col.metric(label, int(totals.get(label, 0)))
+st.bar_chart(filtered.pivot_table(index="csp", columns="classification", values="count", fill_value=0))
+
+# ── Scores par CSP / wilaya ────────────────────
+st.header("Scores par CSP et wilaya")
+csp_wilaya, _ = load_summary("csp_wilaya")
+if not csp_wilaya.empty:
+    csp_wilaya = csp_wilaya[csp_wilaya["csp"].isin(selected)]
+    st.bar_chart(csp_wilaya.groupby("wilaya")["te_moyen"].mean().sort_values(ascending=False))
+    st.dataframe(csp_wilaya, use_container_width=True, hide_index=True)
+
+# ── Distribution du TE (sketches) ──────────────
+st.header("Percentiles du TE par CSP")
+percentiles, _ = load_summary("percentiles")
+if not percentiles.empty:
+    st.dataframe(percentiles[percentiles["csp"].isin(selected)].set_index("csp"), use_container_width=True)
+
+# ── Marché + poids ─────────────────────────────
+left, right = st.columns(2)
+with left:
+    st.header("Tension du marché")
+    market, _ = load_summary("market")
+    if not market.empty:
+        st.dataframe(market.set_index("csp"), use_container_width=True)
+with right:
+    st.header("Poids Savoir / Savoir-faire / Savoir-être")
+    weights, _ = load_summary("weights")
+    if not weights.empty:
+        st.dataframe(weights.set_index("csp"), use_container_width=True)
+
+# ── Top profils ────────────────────────────────
+st.header("Top profils Optimale")
+top, _ = load_summary("top_optimale")
+if not top.empty:
+    top = top[top["csp"].isin(selected)]
+    st.dataframe(top, use_container_width=True, hide_index=True)
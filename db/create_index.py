@@ -1,5 +1,17 @@
+# db/create_index.py
+"""
+Index manager for ANEM Employabilité.
+Run: python -m db.create_index
+
+Declares the hot queries of the project in one place, creates the
+compound / covering indexes they need, then runs explain() on each query
+and fails loudly if one of them falls back to a COLLSCAN or an in-memory SORT.
+"""
+
 from pymongo import MongoClient
 import os
+import sys
+from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()  # reads .env file
@@ -10,19 +22,338 @@ client = MongoClient(uri)
 db_name = os.getenv("DATABASE_NAME")
 db = client[db_name]
 
-db.profils.create_index("csp")
-db.profils.create_index("id_demandeur", unique=True)
-db.profils.create_index([("csp", 1), ("score_employabilite", -1)])  # top profiles per CSP
+OPTIMAL_THRESHOLD = 70.0  # same cut-off as scoring/optimal_set.py
+
+# ────────────────────────────────────────────────
+# INDEXES (one entry per collection)
+# ────────────────────────────────────────────────
+
+INDEXES = {
+    "profils": [
+        {"keys": [("id_demandeur", 1)], "unique": True},
+        # recommendation agent: csp + full_te >= seuil (also serves csp-only counts)
+        {"keys": [("csp", 1), ("full_te", -1)]},
+        # recommendation fallback (all CSPs) + low TE sampling
+        {"keys": [("full_te", -1)]},
+        # show_top_optimale: covering (filter, sort, projection all in the index)
+        {"keys": [("te_classification", 1), ("full_te", -1), ("id_demandeur", 1), ("csp", 1)]},
+        # targeted rescoring: _id-ordered pages of a few CSPs
+        {"keys": [("csp", 1), ("_id", 1)]},
+        # prototype candidates: members of the probed clusters (agents/prototypes.py)
+        {"keys": [("csp", 1), ("proto.csp", 1)]},
+        {"keys": [("proto.all", 1)]},
+    ],
+    "offres": [
+        {"keys": [("id_offre", 1)], "unique": True},  # db/ingest.py upserts on it
+        {"keys": [("csp", 1), ("statut", 1)]},
+        {"keys": [("wilaya", 1)]},
+        {"keys": [("comp_ids", 1)]},  # offers requiring a skill (int multikey)
+    ],
+    "placements": [
+        # weighting agent ($match csp then $lookup on id_demandeur)
+        {"keys": [("csp", 1), ("id_demandeur", 1)]},
+        {"keys": [("id_demandeur", 1)]},
+        {"keys": [("date_placement", 1)]},
+    ],
+    "referentiels": [
+        {"keys": [("type", 1), ("code", 1)], "unique": True},
+        # interned labels (scoring/labels.py): one id per normalised libelle
+        {"keys": [("type", 1), ("kind", 1), ("norm", 1)], "unique": True,
+         "partialFilterExpression": {"type": "label"}},
+    ],
+    "placement_rollups": [
+        # bucket upserts (add_placements) + windowed duree lookups (scoring/placement_rollups.py)
+        {"keys": [("csp", 1), ("wilaya", 1), ("month", 1)], "unique": True},
+        {"keys": [("csp", 1), ("month", -1)]},
+    ],
+    "batch_runs": [
+        # --resume: last unfinished run
+        {"keys": [("status", 1), ("started_at", -1)]},
+    ],
+    "dynamic_weights": [
+        # tables.load_tables: active version per CSP; publish: next version number
+        {"keys": [("csp", 1), ("version", -1)], "unique": True},
+        {"keys": [("active", 1), ("csp", 1)]},
+    ],
+    "weight_runs": [
+        # update_weights: last run of a CSP
+        {"keys": [("csp", 1), ("run_at", -1)]},
+    ],
+    "score_sketches": [
+        # page / merged sketches of a run (scoring/score_sketches.py)
+        {"keys": [("run", 1), ("csp", 1), ("p", 1), ("w", 1)], "unique": True,
+         "partialFilterExpression": {"run": {"$exists": True}}},
+    ],
+    "scoring_jobs": [
+        # claim_unit: pending / expired units of a job, in seq order
+        {"keys": [("job_id", 1), ("status", 1), ("seq", 1)]},
+        {"keys": [("kind", 1), ("created_at", -1)]},
+    ],
+}
+
+# Indexes replaced by the ones above (prefix-redundant or on fields nothing writes)
+OBSOLETE_INDEXES = {
+    "profils": ["csp_1", "csp_1_score_employabilite_-1"],
+    "offres": ["csp_1"],
+    # avg duree per CSP now comes from market_counters / placement_rollups
+    "placements": ["csp_1", "csp_1_duree_attente_jours_1"],
+}
+
+# ────────────────────────────────────────────────
+# HOT QUERIES (explain commands, with representative values)
+# ────────────────────────────────────────────────
+
+HOT_QUERIES = [
+    {
+        "name": "show_top_optimale",
+        "used_by": "scoring/batch_scoring.py",
+        "command": {
+            "find": "profils",
+            "filter": {"te_classification": "Employabilité Optimale"},
+            "projection": {"_id": 0, "id_demandeur": 1, "csp": 1, "full_te": 1},
+            "sort": {"full_te": -1},
+            "limit": 10,
+        },
+    },
+    {
+        "name": "rescore_page",
+        "used_by": "scoring/batch_scoring.py",
+        "command": {
+            "find": "profils",
+            "filter": {"csp": {"$in": ["Management", "Personnel d'aide"]}},
+            "sort": {"_id": 1},
+            "limit": 500,
+        },
+    },
+    {
+        "name": "optimal_same_csp",
+        "used_by": "agents/recommendation_agent.py",
+        "command": {
+            "find": "profils",
+            "filter": {"csp": "Management", "full_te": {"$gte": OPTIMAL_THRESHOLD}},
+        },
+    },
+    {
+        "name": "optimal_all_csp",
+        "used_by": "agents/recommendation_agent.py",
+        "command": {
+            "find": "profils",
+            "filter": {"full_te": {"$gte": OPTIMAL_THRESHOLD}},
+        },
+    },
+    {
+        "name": "prototype_candidates_csp",
+        "used_by": "agents/prototypes.py",
+        "command": {
+            "find": "profils",
+            "filter": {"csp": "Management", "full_te": {"$gte": OPTIMAL_THRESHOLD}, "proto.csp": {"$in": [0, 1, 2]}},
+        },
+    },
+    {
+        "name": "prototype_candidates_all",
+        "used_by": "agents/prototypes.py",
+        "command": {
+            "find": "profils",
+            "filter": {"full_te": {"$gte": OPTIMAL_THRESHOLD}, "proto.all": {"$in": [0, 1, 2]}},
+        },
+    },
+    {
+        "name": "low_te_sample",
+        "used_by": "agents/recommendation_agent.py",
+        "command": {
+            "find": "profils",
+            "filter": {"full_te": {"$lt": OPTIMAL_THRESHOLD}},
+            "projection": {"id_demandeur": 1},
+            "limit": 20,
+        },
+    },
+    {
+        "name": "profil_by_id",
+        "used_by": "scoring/resource_score.py",
+        "command": {
+            "find": "profils",
+            "filter": {"id_demandeur": "DEM-TEST-001"},
+            "limit": 1,
+        },
+    },
+    {
+        "name": "market_counters_by_csp",
+        "used_by": "scoring/market_score.py (market_counters)",
+        "command": {"find": "market_counters", "filter": {"_id": "Management"}, "limit": 1},
+    },
+    {
+        "name": "duree_window",
+        "used_by": "scoring/market_score.py (placement_rollups)",
+        "command": {
+            "find": "placement_rollups",
+            "filter": {"csp": "Management", "month": {"$gte": datetime(2025, 1, 1)}},
+        },
+    },
+    {
+        "name": "sketch_current",
+        "used_by": "scoring/score_sketches.py (load_sketch)",
+        "command": {
+            "find": "score_sketches",
+            "filter": {"$or": [{"run": "0123456789ab", "csp": "Management", "p": None}]},
+            "projection": {"bins.te": 1},
+        },
+    },
+    {
+        "name": "sketch_pages",
+        "used_by": "scoring/score_sketches.py (merge_pages)",
+        "command": {
+            "find": "score_sketches",
+            "filter": {"run": "0123456789ab", "p": {"$ne": None}},
+        },
+    },
+    {
+        "name": "sketch_replaced_runs",
+        "used_by": "scoring/score_sketches.py (publish_sketches)",
+        "command": {
+            "delete": "score_sketches",
+            "deletes": [{"q": {"run": {"$exists": True, "$nin": ["0123456789ab"]},
+                               "csp": {"$in": ["Management"]}}, "limit": 0}],
+        },
+    },
+    {
+        "name": "active_dynamic_weights",
+        "used_by": "scoring/tables.py (load_tables)",
+        "command": {"find": "dynamic_weights", "filter": {"active": True}},
+    },
+    {
+        "name": "active_dynamic_weights_csp",
+        "used_by": "scoring/tables.py (publish_dynamic_weights)",
+        "command": {"find": "dynamic_weights", "filter": {"csp": "Management", "active": True}, "limit": 1},
+    },
+    {
+        "name": "claim_failed_run",
+        "used_by": "scoring/batch_scoring.py (--resume)",
+        "command": {
+            "findAndModify": "batch_runs",
+            "query": {"$or": [
+                {"status": "failed"},
+                {"status": "running", "updated_at": {"$lt": datetime(2025, 1, 1)}},
+            ]},
+            "sort": {"started_at": -1},
+            "update": {"$set": {"status": "running"}},
+        },
+    },
+    {
+        "name": "claim_unit",
+        "used_by": "scoring/work_queue.py",
+        "command": {
+            "findAndModify": "scoring_jobs",
+            "query": {
+                "job_id": "0123456789ab",
+                "kind": "unit",
+                "attempts": {"$lt": 5},
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "leased", "lease_expires": {"$lt": datetime(2025, 1, 1)}},
+                ],
+            },
+            "sort": {"seq": 1},
+            "update": {"$set": {"status": "leased"}, "$inc": {"attempts": 1}},
+        },
+    },
+    {
+        "name": "placed_profiles_join",
+        "used_by": "agents/weighting_agent.py",
+        "command": {
+            "aggregate": "placements",
+            "pipeline": [
+                {"$match": {"csp": "Management"}},
+                {"$lookup": {
+                    "from": "profils",
+                    "localField": "id_demandeur",
+                    "foreignField": "id_demandeur",
+                    "as": "profil",
+                }},
+            ],
+            "cursor": {},
+        },
+    },
+    {
+        # queryPlanner explain of the join above does not show the $lookup side: declared on its own
+        "name": "placed_profiles_lookup",
+        "used_by": "agents/weighting_agent.py ($lookup into profils)",
+        "command": {"find": "profils", "filter": {"id_demandeur": "DEM-TEST-001"}},
+    },
+    {
+        "name": "placements_by_demandeur",
+        "used_by": "agents/weighting_agent.py",
+        "command": {"find": "placements", "filter": {"id_demandeur": "DEM-TEST-001"}},
+    },
+]
+
+BAD_STAGES = {"COLLSCAN": "collection scan", "SORT": "in-memory sort"}
+
+# ────────────────────────────────────────────────
+# HELPERS
+# ────────────────────────────────────────────────
+
+def ensure_indexes(db=db):
+    """Create every declared index and drop the obsolete ones"""
+    for coll, specs in INDEXES.items():
+        existing = db[coll].index_information()
+        for name in OBSOLETE_INDEXES.get(coll, []):
+            if name in existing:
+                db[coll].drop_index(name)
+                print(f"  - dropped {coll}.{name}")
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            name = db[coll].create_index(spec["keys"], **options)
+            print(f"  + {coll}.{name}")
+
+def find_plan_problems(node, problems=None):
+    """Walk an explain() output and collect COLLSCAN / in-memory SORT stages"""
+    if problems is None:
+        problems = []
+    if isinstance(node, dict):
+        stage = node.get("stage")
+        if stage in BAD_STAGES:
+            problems.append(BAD_STAGES[stage])
+        if "$sort" in node and "sortKey" in node["$sort"]:
+            problems.append(BAD_STAGES["SORT"])  # aggregation sort not pushed to an index
+        for key, value in node.items():
+            if key != "rejectedPlans":  # only the winning plan matters
+                find_plan_problems(value, problems)
+    elif isinstance(node, list):
+        for value in node:
+            find_plan_problems(value, problems)
+    return problems
+
+def explain_query(query, db=db):
+    return db.command("explain", query["command"], verbosity="queryPlanner")
+
+def verify_hot_queries(db=db):
+    """Explain every hot query; raise RuntimeError if any plan is not index-backed"""
+    failures = []
+    for query in HOT_QUERIES:
+        plan = explain_query(query, db)
+        problems = sorted(set(find_plan_problems(plan)))
+        if problems:
+            failures.append(f"{query['name']} ({query['used_by']}): {', '.join(problems)}")
+            print(f"  ✗ {query['name']}: {', '.join(problems)}")
+        else:
+            print(f"  ✓ {query['name']}")
 
-# Offres
-db.offres.create_index("csp")
-db.offres.create_index("wilaya")
+    if failures:
+        raise RuntimeError("Hot queries without a matching index:\n  " + "\n  ".join(failures))
 
-# Placements - for historical averages
-db.placements.create_index("csp")
-db.placements.create_index("date_placement")
+# ────────────────────────────────────────────────
+# MAIN
+# ────────────────────────────────────────────────
 
-# Referentiels - small collection
-db.referentiels.create_index([("type", 1), ("code", 1)], unique=True)
+if __name__ == "__main__":
+    print("Creating indexes...")
+    ensure_indexes()
+    print("Indexes created!")
 
-print("Indexes created!")
\ No newline at end of file
+    print("\nVerifying query plans...")
+    try:
+        verify_hot_queries()
+    except RuntimeError as e:
+        print(f"\n{e}")
+        sys.exit(1)
+    print("All hot queries are index-backed.")
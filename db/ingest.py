@@ -0,0 +1,313 @@
+# db/ingest.py
+"""
+Bulk ingestion of ANEM exports (CSV or Excel) into profils / offres.
+Run: python -m db.ingest profils export_demandeurs.csv [--chunk-size 5000] [--sep ";"]
+     python -m db.ingest offres export_offres.xlsx [--rejects rejets.csv]
+
+Rows are streamed in chunks (csv module / openpyxl read-only mode), normalised
+into the profils / offres schema (diploma levels and CSP matched on the scoring
+tables, skills interned with scoring/labels.py) and upserted on id_demandeur /
+id_offre with one unordered bulk write per chunk: re-importing a file updates
+the same documents, and updated_at (which invalidates the recommendation
+cache) only moves when a row's contents actually differ. A parser thread fills a bounded queue while the main
+thread writes, so parsing and writing overlap without reading ahead.
+
+List cells hold "|"-separated items, or a JSON array:
+  diplomes               "Diplôme Bac +5:Informatique|Diplôme FP NIVEAU 2"   (niveau[:domaine])
+  experiences            "Comptable:36|Stagiaire:6"                           (poste:duree_mois)
+  competences_techniques "Python:4|SQL"                                       (nom[:etoiles])
+  soft_skills, competences_requises  "Autonomie|Rigueur"
+"""
+
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+from dateutil import parser as dateparser
+from collections import Counter
+from itertools import islice
+import argparse
+import csv
+import json
+import os
+import queue
+import threading
+import time
+import unicodedata
+from scoring.tables import get_tables
+from scoring.labels import encode_profil, encode_offre
+from scoring.market_counters import count_new_profils, count_new_offres, reconcile_counters
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+CHUNK_SIZE = 5000
+QUEUE_CHUNKS = 4        # parsed chunks waiting for the writer (bounds memory)
+
+class RowRejected(ValueError):
+    pass
+
+# ────────────────────────────────────────────────
+# READERS (streaming)
+# ────────────────────────────────────────────────
+
+def iter_csv_rows(path: str, sep: str = None):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if sep is None:
+            sep = csv.Sniffer().sniff(f.read(65536), delimiters=",;\t|").delimiter
+            f.seek(0)
+        yield from csv.DictReader(f, delimiter=sep)
+
+def iter_excel_rows(path: str):
+    from openpyxl import load_workbook  # read-only mode streams the sheet
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+        for values in rows:
+            yield {h: ("" if v is None else v) for h, v in zip(header, values)}
+    finally:
+        wb.close()
+
+def iter_rows(path: str, sep: str = None):
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return iter_excel_rows(path)
+    return iter_csv_rows(path, sep)
+
+# ────────────────────────────────────────────────
+# NORMALISATION
+# ────────────────────────────────────────────────
+
+def match_key(value) -> str:
+    """Case-, accent- and space-insensitive key for referentiel matching"""
+    text = unicodedata.normalize("NFKD", str(value))
+    return " ".join("".join(c for c in text if not unicodedata.combining(c)).split()).casefold()
+
+def build_lookups() -> dict:
+    tables = get_tables()
+    return {
+        "niveau": {match_key(n): n for n in tables["savoir_scores"]},
+        "csp": {match_key(c): c for c in tables["csp_categories"]},
+    }
+
+def cell(row: dict, name: str):
+    value = row.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    return value if value not in ("", None) else None
+
+def split_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str) and value.startswith("["):
+        return json.loads(value)
+    return [item.strip() for item in str(value).split("|") if item.strip()]
+
+def parse_pair(item, default_second=None):
+    if isinstance(item, dict):
+        return item
+    first, _, second = str(item).partition(":")
+    return first.strip(), (second.strip() or default_second)
+
+def parse_date(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        parsed = dateparser.parse(str(value), dayfirst=True)
+    except (ValueError, OverflowError):
+        raise RowRejected(f"date invalide: {value}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def parse_int(value, field: str):
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        raise RowRejected(f"{field} non numérique: {value}")
+
+def required(row: dict, name: str):
+    value = cell(row, name)
+    if value is None:
+        raise RowRejected(f"{name} manquant")
+    return value
+
+def canonical(lookups: dict, kind: str, value) -> str:
+    try:
+        return lookups[kind][match_key(value)]
+    except KeyError:
+        raise RowRejected(f"{kind} inconnu: {value}")
+
+def normalize_profil(row: dict, lookups: dict) -> dict:
+    diplomes = []
+    for item in split_list(cell(row, "diplomes")):
+        if isinstance(item, dict):
+            diplomes.append({**item, "niveau": canonical(lookups, "niveau", item.get("niveau"))})
+        else:
+            niveau, domaine = parse_pair(item)
+            diplomes.append({"niveau": canonical(lookups, "niveau", niveau), "domaine": domaine})
+
+    experiences = []
+    for item in split_list(cell(row, "experiences")):
+        if isinstance(item, dict):
+            experiences.append(item)
+        else:
+            poste, duree = parse_pair(item, "0")
+            experiences.append({"poste": poste, "duree_mois": parse_int(duree, "duree_mois")})
+
+    competences = []
+    for item in split_list(cell(row, "competences_techniques")):
+        if isinstance(item, dict):
+            competences.append(item)
+        else:
+            nom, etoiles = parse_pair(item, "3")
+            competences.append({"nom": nom, "etoiles": parse_int(etoiles, "etoiles")})
+
+    profil = {
+        "id_demandeur": str(required(row, "id_demandeur")),
+        "nom_complet": cell(row, "nom_complet"),
+        "genre": cell(row, "genre"),
+        "date_naissance": parse_date(cell(row, "date_naissance")),
+        "wilaya": cell(row, "wilaya"),
+        "commune": cell(row, "commune"),
+        "csp": canonical(lookups, "csp", required(row, "csp")),
+        "date_inscription": parse_date(cell(row, "date_inscription")),
+        "diplomes": diplomes,
+        "experiences": experiences,
+        "competences_techniques": competences,
+        "soft_skills": [str(s) for s in split_list(cell(row, "soft_skills"))],
+    }
+    profil = {k: v for k, v in profil.items() if v is not None}
+    return {**profil, **encode_profil(profil)}
+
+def normalize_offre(row: dict, lookups: dict) -> dict:
+    niveau = cell(row, "niveau_etude_min")
+    offre = {
+        "id_offre": str(required(row, "id_offre")),
+        "titre": cell(row, "titre"),
+        "csp": canonical(lookups, "csp", required(row, "csp")),
+        "secteur": cell(row, "secteur"),
+        "wilaya": cell(row, "wilaya"),
+        "date_publication": parse_date(cell(row, "date_publication")),
+        "date_cloture": parse_date(cell(row, "date_cloture")),
+        "competences_requises": [str(c) for c in split_list(cell(row, "competences_requises"))],
+        "niveau_etude_min": canonical(lookups, "niveau", niveau) if niveau else None,
+        "experience_min_mois": parse_int(cell(row, "experience_min_mois"), "experience_min_mois"),
+        "statut": cell(row, "statut") or "Ouverte",
+    }
+    offre = {k: v for k, v in offre.items() if v is not None}
+    return {**offre, **encode_offre(offre)}
+
+TARGETS = {
+    "profils": {"key": "id_demandeur", "normalize": normalize_profil, "count_new": count_new_profils},
+    "offres": {"key": "id_offre", "normalize": normalize_offre, "count_new": count_new_offres},
+}
+
+# ────────────────────────────────────────────────
+# PIPELINE (parser thread → bounded queue → bulk writer)
+# ────────────────────────────────────────────────
+
+def parse_chunks(rows, normalize, chunk_size: int, out: queue.Queue, reasons: Counter, rejects: list = None):
+    """Producer: normalised chunks (docs, rejected count) then None; rejected rows kept only if rejects is a list"""
+    try:
+        lookups = build_lookups()
+        line = 1  # header
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            docs, rejected = {}, 0
+            for row in chunk:
+                line += 1
+                try:
+                    doc = normalize(row, lookups)
+                except (RowRejected, ValueError) as e:
+                    rejected += 1
+                    reasons[str(e).split(":")[0]] += 1
+                    if rejects is not None:
+                        rejects.append({"ligne": line, "raison": str(e)})
+                    continue
+                docs[doc.get("id_demandeur") or doc.get("id_offre")] = doc  # last row wins within a chunk
+            out.put((list(docs.values()), rejected))
+    except BaseException as e:
+        out.put(e)
+    finally:
+        out.put(None)
+
+def upsert_pipeline(doc: dict, now: datetime) -> list:
+    """Update pipeline: overwrite the fields, bump updated_at only if one of them differs"""
+    values = {k: {"$literal": v} for k, v in doc.items()}
+    changed = {"$or": [{"$ne": [f"${k}", v]} for k, v in values.items()]}
+    return [
+        {"$set": {
+            "updated_at": {"$cond": [changed, now, "$updated_at"]},
+            "created_at": {"$ifNull": ["$created_at", now]},
+        }},
+        {"$set": values},
+    ]
+
+def write_chunk(collection: str, key: str, docs: list):
+    """Idempotent upsert on the business key → (inserted docs, modified count, unchanged count)"""
+    if not docs:
+        return [], 0, 0
+    now = datetime.now(timezone.utc)
+    result = db[collection].bulk_write([
+        UpdateOne({key: doc[key]}, upsert_pipeline(doc, now), upsert=True)
+        for doc in docs
+    ], ordered=False)
+    inserted = [docs[i] for i in result.upserted_ids]
+    # identical rows are no-op updates: matched but not modified
+    return inserted, result.modified_count, result.matched_count - result.modified_count
+
+def ingest(collection: str, path: str, chunk_size: int = CHUNK_SIZE, sep: str = None, rejects_path: str = None) -> dict:
+    target = TARGETS[collection]
+    chunks, reasons = queue.Queue(maxsize=QUEUE_CHUNKS), Counter()
+    rejects = [] if rejects_path else None
+    parser = threading.Thread(
+        target=parse_chunks,
+        args=(iter_rows(path, sep), target["normalize"], chunk_size, chunks, reasons, rejects),
+        daemon=True,
+    )
+    parser.start()
+
+    stats = Counter()
+    t0 = time.perf_counter()
+    while (item := chunks.get()) is not None:
+        if isinstance(item, BaseException):
+            raise item
+        docs, rejected = item
+        inserted, updated, unchanged = write_chunk(collection, target["key"], docs)
+        target["count_new"](inserted)  # market_counters: only documents that did not exist
+        stats.update(rows=len(docs) + rejected, inserted=len(inserted), updated=updated,
+                     unchanged=unchanged, rejected=rejected)
+        rate = stats["rows"] / max(time.perf_counter() - t0, 1e-9)
+        print(f"  {collection}: {stats['rows']} lignes ({stats['inserted']} nouvelles, {stats['updated']} mises à jour,"
+              f" {stats['unchanged']} inchangées, {stats['rejected']} rejetées) — {rate:.0f} lignes/s")
+    parser.join()
+
+    if stats["updated"]:
+        reconcile_counters()  # modified rows may have changed csp / statut
+    if reasons:
+        print("  Motifs de rejet: " + ", ".join(f"{reason} ({n})" for reason, n in reasons.most_common(5)))
+        if rejects_path:
+            with open(rejects_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=["ligne", "raison"])
+                writer.writeheader()
+                writer.writerows(rejects)
+
+    elapsed = time.perf_counter() - t0
+    stats = {**stats, "seconds": round(elapsed, 1), "rows_per_s": round(stats["rows"] / max(elapsed, 1e-9))}
+    print(f"✓ {path} → {collection}: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk ingestion of CSV / Excel exports")
+    parser.add_argument("collection", choices=sorted(TARGETS))
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sep", help="CSV separator (auto-detected by default)")
+    parser.add_argument("--rejects", help="write rejected rows (line, reason) to this CSV")
+    args = parser.parse_args()
+
+    ingest(args.collection, args.path, args.chunk_size, args.sep, args.rejects)
@@ -0,0 +1,52 @@
+# db/migrate_labels.py
+"""
+Migration: intern skill / soft skill / diploma / CSP labels (scoring/labels.py)
+and store their integer ids next to the strings, duplicates removed.
+Run: python -m db.migrate_labels
+
+Idempotent: walks profils and offres in _id-ordered pages and rewrites the
+label fields with one unordered bulk write per page.
+"""
+
+from pymongo import MongoClient, UpdateOne
+import os
+import time
+from dotenv import load_dotenv
+from scoring.labels import encode_profil, encode_offre
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+PAGE_SIZE = 1000
+
+PROFIL_FIELDS = {"csp": 1, "diplomes": 1, "experiences": 1, "competences_techniques": 1, "soft_skills": 1}
+OFFRE_FIELDS = {"csp": 1, "competences_requises": 1, "niveau_etude_min": 1}
+
+def migrate(collection: str, fields: dict, encoder):
+    coll = db[collection]
+    last_id, migrated = None, 0
+    t0 = time.perf_counter()
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        page = list(coll.find(query, fields).sort("_id", 1).limit(PAGE_SIZE))
+        if not page:
+            break
+        coll.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": encoder(doc)}) for doc in page],
+            ordered=False
+        )
+        last_id = page[-1]["_id"]
+        migrated += len(page)
+        print(f"  {collection}: {migrated} ({migrated / (time.perf_counter() - t0):.0f} docs/s)")
+    return migrated
+
+if __name__ == "__main__":
+    print("Migration des libellés → ids...")
+    n_profils = migrate("profils", PROFIL_FIELDS, encode_profil)
+    n_offres = migrate("offres", OFFRE_FIELDS, encode_offre)
+    print(f"✓ {n_profils} profils et {n_offres} offres migrés")
+    
+    # prototypes were built on string-keyed features: rebuild with python -m agents.prototypes
+    db.optimal_prototypes.delete_many({})
+    db.recommendation_cache.delete_many({})
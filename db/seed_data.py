@@ -1,23 +1,41 @@
 # db/seed_data.py
 """
 Complete coherent synthetic population seeding for ANEM Employabilité.
-Run: python db/seed_data.py
+Run: python -m db.seed_data
+     python -m db.seed_data --profils 1000000 --offres 200000 --placements 300000 --workers 8
 
 This will:
-1. Clear existing data (optional, comment if you want to append)
+1. Clear existing data (--keep to append)
 2. Seed referentiels (metiers, secteurs, CSP, niveaux, wilayas)
+   + the scoring tables (savoir scores, CSP weights) read by scoring/tables.py
 3. Seed profils (job seekers with detailed attributes)
 4. Seed offres (job offers with requirements)
 5. Seed placements (linked matches with realistic waiting times)
+
+Deterministic: chunk k of a collection is generated by its own
+random.Random(f"{seed}:{collection}:{k}"), ids are derived from the document
+index and dates from --as-of, so the same seed + as-of + chunk size gives the
+same population whatever the number of workers. The chunk size is part of the
+seed: chunk k covers different documents when --chunk-size changes, so a
+different chunk size generates a different population. Chunks are generated and inserted
+(unordered insert_many) by worker processes, one chunk in memory per worker.
+Placements pick their profil in an in-memory index → CSP / wilaya map
+returned by the profil chunks (one byte each), without querying profils.
 """
 
-import uuid
-from pymongo import MongoClient
-from datetime import datetime, date, timezone, timedelta
-from random import choice, randint, uniform
+from pymongo import MongoClient, UpdateOne
+from datetime import datetime, timezone, timedelta
+from collections import Counter
 from faker import Faker
+import argparse
+import multiprocessing
 import os
+import random
+import time
 from dotenv import load_dotenv
+from scoring.tables import seed_scoring_referentiels
+from scoring.labels import encode_profil, encode_offre, intern
+from scoring.market_counters import count_new_profils, count_new_offres, count_new_placements
 
 # ────────────────────────────────────────────────
 # CONFIG
@@ -28,7 +46,17 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "anem_employabilite")
 
 # Collections
-COLLECTIONS = ["profils", "offres", "placements", "referentiels"]
+COLLECTIONS = ["profils", "offres", "placements", "referentiels", "market_counters", "placement_rollups"]
+# Derived from the collections above: stale once they are reseeded (ids are reused)
+DERIVED_COLLECTIONS = [
+    "dynamic_weights", "weight_runs", "optimal_prototypes", "recommendation_cache", "optimal_versions",
+    "batch_runs", "scoring_jobs", "score_sketches", "score_history", "score_history_monthly",
+    "dashboard_summary"
+]
+
+SEED = 42
+CHUNK_SIZE = 5000
+POOL_SIZE = 500   # Faker values drawn once per process (postes, entreprises, phrases)
 
 # ────────────────────────────────────────────────
 # ALGERIAN DATA
@@ -97,75 +125,95 @@ SURNAMES = ["Saidi", "Slimani", "Touati", "Benali", "Mansouri", "Brahimi", "Dahm
 # HELPERS
 # ────────────────────────────────────────────────
 
-fake = Faker('fr_FR')
+def chunk_rng(seed: int, collection: str, chunk: int) -> random.Random:
+    return random.Random(f"{seed}:{collection}:{chunk}")
+
+def build_pools(seed: int) -> dict:
+    """Faker is slow: draw a fixed pool of values once, then sample it"""
+    fake = Faker('fr_FR')
+    fake.seed_instance(seed)
+    return {
+        "postes": [fake.job()[:40] for _ in range(POOL_SIZE)],
+        "entreprises": [fake.company()[:30] for _ in range(POOL_SIZE)],
+        "phrases": [fake.sentence(nb_words=8)[:80] for _ in range(POOL_SIZE)],
+    }
 
-def to_datetime(d):
-    """Convert date to datetime (midnight UTC)"""
-    if isinstance(d, date) and not isinstance(d, datetime):
-        return datetime.combine(d, datetime.min.time(), tzinfo=timezone.utc)
-    elif isinstance(d, datetime):
-        return d.replace(tzinfo=timezone.utc) if d.tzinfo is None else d
-    return d
+def rand_datetime(rng, start: datetime, end: datetime) -> datetime:
+    return start + timedelta(seconds=rng.randrange(max(int((end - start).total_seconds()), 1)))
 
-def random_date_past_years(years_back=10):
-    start = datetime.now() - timedelta(days=365 * years_back)
-    return fake.date_between(start_date=start, end_date="today")
+def days_before(as_of: datetime, days: int) -> datetime:
+    return as_of - timedelta(days=days)
 
-def random_diplomes():
+def random_diplomes(rng):
     """Generate realistic diplomas for job seekers"""
-    num = choice([0, 1, 1, 1, 2, 2, 3])  # biased toward 1–2
+    num = rng.choice([0, 1, 1, 1, 2, 2, 3])  # biased toward 1–2
     diplomes = []
     
     for _ in range(num):
-        niveau = choice(DIPLOMES_LEVELS)
+        niveau = rng.choice(DIPLOMES_LEVELS)
         diplomes.append({
             "niveau": niveau,
-            "domaine": choice(["Informatique", "Gestion", "Génie Civil", "Santé", "Commerce", "Langues", "Autre"]),
-            "annee_obtention": randint(2015, 2025),
-            "etablissement": choice(["USTHB", "Université de Blida", "École Nationale Polytechnique", "Université d'Annaba", "Centre de Formation", "Privé"])
+            "domaine": rng.choice(["Informatique", "Gestion", "Génie Civil", "Santé", "Commerce", "Langues", "Autre"]),
+            "annee_obtention": rng.randint(2015, 2025),
+            "etablissement": rng.choice(["USTHB", "Université de Blida", "École Nationale Polytechnique", "Université d'Annaba", "Centre de Formation", "Privé"])
         })
     return diplomes
 
-def random_experiences():
+def random_experiences(rng, pools, as_of):
     """Generate work experiences"""
-    num = randint(0, 5)
+    num = rng.randint(0, 5)
     experiences = []
-    current_year = datetime.now().year
     for _ in range(num):
-        duree_mois = randint(3, 120)  # 3 months to 10 years
-        start_year = current_year - (duree_mois // 12 + randint(0, 3))
+        duree_mois = rng.randint(3, 120)  # 3 months to 10 years
+        start_year = as_of.year - (duree_mois // 12 + rng.randint(0, 3))
         experiences.append({
-            "poste": fake.job()[:40],
-            "entreprise": fake.company()[:30],
-            "date_debut": f"{start_year}-{randint(1,12):02d}-01",
+            "poste": rng.choice(pools["postes"]),
+            "entreprise": rng.choice(pools["entreprises"]),
+            "date_debut": f"{start_year}-{rng.randint(1,12):02d}-01",
             "duree_mois": duree_mois,
-            "competences": [choice(TECH_COMPETENCES_POOL) for _ in range(randint(1,4))]
+            "competences": rng.sample(TECH_COMPETENCES_POOL, rng.randint(1, 4))
         })
     return experiences
 
-def random_competences_techniques():
-    """Generate technical competencies with ratings"""
-    num = randint(0, 8)
+def random_competences_techniques(rng):
+    """Generate technical competencies with ratings (distinct skills)"""
+    num = rng.randint(0, 8)
     return [
-        {"nom": choice(TECH_COMPETENCES_POOL), "etoiles": randint(1, 5)}
-        for _ in range(num)
+        {"nom": nom, "etoiles": rng.randint(1, 5)}
+        for nom in rng.sample(TECH_COMPETENCES_POOL, num)
     ]
 
-def random_soft_skills():
+def random_soft_skills(rng):
     """Generate unique soft skills"""
-    num = randint(0, 6)
-    return list(set(choice(SOFT_SKILLS_POOL) for _ in range(num)))
+    num = rng.randint(0, 6)
+    return sorted(set(rng.choice(SOFT_SKILLS_POOL) for _ in range(num)))
+
+def intern_pools():
+    """Intern every label the generators use, in a fixed order, before the workers start"""
+    for kind, labels in [
+        ("niveau_etude", DIPLOMES_LEVELS),
+        ("csp", CSP_CATEGORIES),
+        ("competence", TECH_COMPETENCES_POOL),
+        ("soft_skill", SOFT_SKILLS_POOL),
+    ]:
+        for libelle in labels:
+            intern(kind, libelle)
 
 # ────────────────────────────────────────────────
 # CLEAR COLLECTIONS
 # ────────────────────────────────────────────────
 
 def clear_collections():
-    """Clear all collections (comment this in main if you want to keep existing data)"""
+    """Clear all collections and what was derived from them (--keep skips this)"""
     client = MongoClient(MONGODB_URI)
     db = client[DATABASE_NAME]
-    for coll in COLLECTIONS:
-        count = db[coll].delete_many({}).deleted_count
+    timeseries = {c["name"] for c in db.list_collections(filter={"type": "timeseries"})}
+    for coll in COLLECTIONS + DERIVED_COLLECTIONS:
+        if coll in timeseries:  # score_history: dropped, recreated on the next write by scoring/score_history.py
+            count = db[coll].estimated_document_count()
+            db.drop_collection(coll)
+        else:
+            count = db[coll].delete_many({}).deleted_count
         print(f"Cleared {count} documents from {coll}")
 
 # ────────────────────────────────────────────────
@@ -174,83 +222,94 @@ def clear_collections():
 
 REFERENTIEL_TYPES = ["metier", "secteur", "csp", "niveau_etude", "wilaya"]
 
-def generate_referentiel():
+def generate_referentiel(rng, pools, as_of):
     """Generate a single referentiel document"""
-    ref_type = choice(REFERENTIEL_TYPES)
-    unique_suffix = str(uuid.uuid4())[:6].upper()
+    ref_type = rng.choice(REFERENTIEL_TYPES)
+    unique_suffix = f"{rng.getrandbits(24):06X}"
     
     if ref_type == "metier":
-        libelle = choice(METIERS)
+        libelle = rng.choice(METIERS)
         code = f"MET-{unique_suffix}"
-        competences = [choice(TECH_COMPETENCES_POOL) for _ in range(randint(3,7))]
+        competences = rng.sample(TECH_COMPETENCES_POOL, rng.randint(3, 7))
         return {
             "type": ref_type,
             "code": code,
             "libelle": libelle,
             "competences_cle": competences,
-            "csp_associe": choice(CSP_CATEGORIES),
-            "tension_marche": choice(["Forte", "Moyenne", "Faible"]),
-            "created_at": datetime.now(timezone.utc)
+            "csp_associe": rng.choice(CSP_CATEGORIES),
+            "tension_marche": rng.choice(["Forte", "Moyenne", "Faible"]),
+            "created_at": as_of
         }
     
     elif ref_type == "secteur":
-        libelle = choice(SECTEURS)
+        libelle = rng.choice(SECTEURS)
         code = f"SEC-{libelle[:3].upper()}-{unique_suffix}"
         return {
             "type": ref_type,
             "code": code,
             "libelle": libelle,
-            "description": fake.sentence(nb_words=8)[:80],
-            "created_at": datetime.now(timezone.utc)
+            "description": rng.choice(pools["phrases"]),
+            "created_at": as_of
         }
     
     elif ref_type == "csp":
-        libelle = choice(CSP_CATEGORIES)
+        libelle = rng.choice(CSP_CATEGORIES)
         code = f"CSP-{libelle[:4].upper().replace(' ', '')}-{unique_suffix}"
         return {
             "type": ref_type,
             "code": code,
             "libelle": libelle,
-            "niveau_hierarchique": choice(["Cadre", "Exécution", "Intermédiaire"]),
-            "created_at": datetime.now(timezone.utc)
+            "niveau_hierarchique": rng.choice(["Cadre", "Exécution", "Intermédiaire"]),
+            "created_at": as_of
         }
     
     elif ref_type == "niveau_etude":
-        libelle = choice(DIPLOMES_LEVELS)
+        libelle = rng.choice(DIPLOMES_LEVELS)
         clean_lib = libelle[:8].upper().replace(' ', '').replace('+','P')
         code = f"NIV-{clean_lib}-{unique_suffix}"
         return {
             "type": ref_type,
             "code": code,
             "libelle": libelle,
-            "score_base": randint(0,10),
-            "created_at": datetime.now(timezone.utc)
+            "score_base": rng.randint(0,10),
+            "created_at": as_of
         }
     
     else:  # wilaya
-        libelle = choice(WILAYAS)
+        libelle = rng.choice(WILAYAS)
         code = f"WIL-{libelle[:3].upper()}-{unique_suffix}"
         return {
             "type": ref_type,
             "code": code,
             "libelle": libelle,
-            "region": choice(["Nord", "Sud", "Est", "Ouest", "Centre"]),
-            "created_at": datetime.now(timezone.utc)
+            "region": rng.choice(["Nord", "Sud", "Est", "Ouest", "Centre"]),
+            "created_at": as_of
         }
 
-def seed_referentiels(count=120):
+def seed_referentiels(count=120, seed=SEED, as_of=None):
     """Seed referentiels collection"""
     client = MongoClient(MONGODB_URI)
     db = client[DATABASE_NAME]
     collection = db["referentiels"]
+    as_of = as_of or default_as_of()
+    
+    rng, pools = chunk_rng(seed, "referentiels", 0), build_pools(seed)
+    documents = [generate_referentiel(rng, pools, as_of) for _ in range(count)]
+    # same seed → same codes: existing entries (--keep) are left as they are
+    result = collection.bulk_write([
+        UpdateOne({"type": doc["type"], "code": doc["code"]}, {"$setOnInsert": doc}, upsert=True)
+        for doc in documents
+    ], ordered=False)
     
-    documents = [generate_referentiel() for _ in range(count)]
-    result = collection.insert_many(documents)
+    print(f"✓ Inserted {result.upserted_count} referentiels ({count - result.upserted_count} already present)")
     
-    print(f"✓ Inserted {len(result.inserted_ids)} referentiels")
+    seed_scoring_referentiels()
+    intern_pools()
+    print("✓ Scoring tables (niveau_etude + csp) and labels written")
     
     # Stats by type
     types_count = collection.aggregate([
+        {"$match": {"type": {"$in": REFERENTIEL_TYPES}}},
         {"$group": {"_id": "$type", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ])
@@ -259,175 +318,227 @@ def seed_referentiels(count=120):
         print(f"    {t['_id']}: {t['count']}")
 
 # ────────────────────────────────────────────────
-# PROFILS
+# PROFILS / OFFRES / PLACEMENTS (one document per index)
 # ────────────────────────────────────────────────
 
-def generate_profil():
+def generate_profil(rng, index, pools, as_of):
     """Generate a complete job seeker profile"""
-    csp = choice(CSP_CATEGORIES)
-    genre = choice(["M", "F"])
-    prenom = choice(MALE_FIRST) if genre == "M" else choice(FEMALE_FIRST)
-    nom = choice(SURNAMES)
+    csp = rng.choice(CSP_CATEGORIES)
+    genre = rng.choice(["M", "F"])
+    prenom = rng.choice(MALE_FIRST) if genre == "M" else rng.choice(FEMALE_FIRST)
+    nom = rng.choice(SURNAMES)
     nom_complet = f"{prenom} {nom}"
     
-    inscription_date_raw = fake.date_between(start_date="-36m", end_date="today")
-    inscription_date = to_datetime(inscription_date_raw)
+    inscription_date = rand_datetime(rng, days_before(as_of, 3 * 365), as_of)
     
     # Generate and force diplomas (70% have at least one)
-    diplomes = random_diplomes()
-    if randint(1, 10) <= 7:
+    diplomes = random_diplomes(rng)
+    if rng.randint(1, 10) <= 7:
         if not diplomes:
             diplomes = [{
-                "niveau": choice(DIPLOMES_LEVELS[3:]),
+                "niveau": rng.choice(DIPLOMES_LEVELS[3:]),
                 "domaine": "Informatique",
-                "annee_obtention": randint(2018, 2025),
-                "etablissement": choice(["USTHB", "Université de Blida", "Autre"])
+                "annee_obtention": rng.randint(2018, 2025),
+                "etablissement": rng.choice(["USTHB", "Université de Blida", "Autre"])
             }]
 
     # Generate and force experiences
-    experiences = random_experiences()
+    experiences = random_experiences(rng, pools, as_of)
     if not experiences:
         experiences = [{
             "poste": "Stagiaire / Employé",
-            "duree_mois": randint(12, 60),
-            "date_debut": fake.date_time_between(start_date="-5y", end_date="-1y").strftime("%Y-%m-%d"),
-            "entreprise": fake.company()[:30],
-            "competences": [choice(TECH_COMPETENCES_POOL) for _ in range(randint(1,3))]
+            "duree_mois": rng.randint(12, 60),
+            "date_debut": rand_datetime(rng, days_before(as_of, 5 * 365), days_before(as_of, 365)).strftime("%Y-%m-%d"),
+            "entreprise": rng.choice(pools["entreprises"]),
+            "competences": rng.sample(TECH_COMPETENCES_POOL, rng.randint(1, 3))
         }]
 
     return {
-        "id_demandeur": f"DEM-{fake.uuid4()[:8].upper()}",
+        "id_demandeur": f"DEM-{index:08X}",
         "nom_complet": nom_complet,
-        "date_naissance": to_datetime(fake.date_of_birth(minimum_age=18, maximum_age=60)),
+        "date_naissance": rand_datetime(rng, days_before(as_of, 60 * 365), days_before(as_of, 18 * 365)),
         "genre": genre,
-        "wilaya": choice(WILAYAS),
+        "wilaya": rng.choice(WILAYAS),
         "commune": "Algérie",
-        "telephone": f"0{randint(5,7)}{fake.msisdn()[3:]}",
-        "email": fake.email(),
+        "telephone": f"0{rng.randint(5,7)}{rng.randrange(10**8):08d}",
+        "email": f"{prenom}.{nom}.{index}@exemple.dz".lower(),
         "csp": csp,
         "date_inscription": inscription_date,
         "diplomes": diplomes,
         "experiences": experiences,
-        "competences_techniques": random_competences_techniques(),
-        "soft_skills": random_soft_skills(),
+        "competences_techniques": random_competences_techniques(rng),
+        "soft_skills": random_soft_skills(rng),
         "langues": [
             {"langue": "Arabe", "niveau": "Natif"},
-            {"langue": "Français", "niveau": choice(["Courant", "Intermédiaire", "Élémentaire"])},
-            {"langue": "Anglais", "niveau": choice(["Intermédiaire", "Élémentaire", "Aucun"])}
+            {"langue": "Français", "niveau": rng.choice(["Courant", "Intermédiaire", "Élémentaire"])},
+            {"langue": "Anglais", "niveau": rng.choice(["Intermédiaire", "Élémentaire", "Aucun"])}
         ],
-        "created_at": datetime.now(timezone.utc),
-        "updated_at": datetime.now(timezone.utc),
+        "created_at": as_of,
+        "updated_at": as_of,
     }
 
-def seed_profils(count=300):
-    """Seed profils collection"""
-    client = MongoClient(MONGODB_URI)
-    db = client[DATABASE_NAME]
-    collection = db["profils"]
-    
-    documents = [generate_profil() for _ in range(count)]
-    result = collection.insert_many(documents)
-    
-    print(f"✓ Inserted {len(result.inserted_ids)} profils")
-    
-    # Stats by CSP
-    for csp in CSP_CATEGORIES:
-        count_csp = collection.count_documents({"csp": csp})
-        print(f"    {csp}: {count_csp}")
-
-# ────────────────────────────────────────────────
-# OFFRES
-# ────────────────────────────────────────────────
-
-def generate_offre():
+def generate_offre(rng, index, pools, as_of):
     """Generate a job offer"""
-    csp = choice(CSP_CATEGORIES)
+    csp = rng.choice(CSP_CATEGORIES)
     return {
-        "id_offre": f"OFF-{uuid.uuid4().hex[:8].upper()}",
-        "titre": choice(METIERS) + " - " + choice(["Senior", "Junior", "Confirmé", "Débutant"]),
+        "id_offre": f"OFF-{index:08X}",
+        "titre": rng.choice(METIERS) + " - " + rng.choice(["Senior", "Junior", "Confirmé", "Débutant"]),
         "csp": csp,
-        "secteur": choice(SECTEURS),
-        "wilaya": choice(WILAYAS),
-        "date_publication": datetime.now(timezone.utc) - timedelta(days=randint(1, 365)),
-        "date_cloture": datetime.now(timezone.utc) + timedelta(days=randint(30, 180)),
-        "competences_requises": [choice(TECH_COMPETENCES_POOL) for _ in range(randint(3, 8))],
-        "niveau_etude_min": choice(DIPLOMES_LEVELS[2:]),  # at least FP N2+
-        "experience_min_mois": choice([0, 12, 24, 36, 60]),
-        "statut": choice(["Ouverte", "Ouverte", "Ouverte", "En cours"]),  # bias toward open
-        "created_at": datetime.now(timezone.utc)
+        "secteur": rng.choice(SECTEURS),
+        "wilaya": rng.choice(WILAYAS),
+        "date_publication": as_of - timedelta(days=rng.randint(1, 365)),
+        "date_cloture": as_of + timedelta(days=rng.randint(30, 180)),
+        "competences_requises": rng.sample(TECH_COMPETENCES_POOL, rng.randint(3, 8)),
+        "niveau_etude_min": rng.choice(DIPLOMES_LEVELS[2:]),  # at least FP N2+
+        "experience_min_mois": rng.choice([0, 12, 24, 36, 60]),
+        "statut": rng.choice(["Ouverte", "Ouverte", "Ouverte", "En cours"]),  # bias toward open
+        "created_at": as_of
     }
 
-def seed_offres(count=400):
-    """Seed offres collection"""
-    client = MongoClient(MONGODB_URI)
-    db = client[DATABASE_NAME]
-    collection = db["offres"]
-    
-    documents = [generate_offre() for _ in range(count)]
-    result = collection.insert_many(documents)
-    
-    print(f"✓ Inserted {len(result.inserted_ids)} offres")
-    
-    # Stats per CSP
-    for csp in CSP_CATEGORIES:
-        open_count = collection.count_documents({"csp": csp, "statut": {"$in": ["Ouverte", "En cours"]}})
-        print(f"    {csp}: {open_count} ouvertes/en cours")
+def generate_placement(rng, index, profil_map, n_offres, as_of):
+    """Generate a placement linked to an existing profil (CSP / wilaya from the in-memory map)"""
+    csp_of, wilaya_of = profil_map
+    profil = rng.randrange(len(csp_of))
+    return {
+        "id_placement": f"PL-{index:08X}",
+        "id_demandeur": f"DEM-{profil:08X}",
+        "id_offre": f"OFF-{rng.randrange(n_offres):08X}",
+        "csp": CSP_CATEGORIES[csp_of[profil]],
+        "wilaya": WILAYAS[wilaya_of[profil]],  # placement_rollups bucket key
+        "duree_attente_jours": rng.randint(10, 180),
+        "date_placement": rand_datetime(rng, days_before(as_of, 2 * 365), as_of),
+        "created_at": as_of
+    }
 
 # ────────────────────────────────────────────────
-# PLACEMENTS
+# WORKERS (one chunk = generate + encode + unordered insert)
 # ────────────────────────────────────────────────
 
-def seed_placements(count=250):
-    """Seed placements collection with realistic links"""
-    client = MongoClient(MONGODB_URI)
-    db = client[DATABASE_NAME]
-    
-    profil_ids = [p["id_demandeur"] for p in db.profils.find({}, {"id_demandeur": 1})]
-    offre_ids = [o["id_offre"] for o in db.offres.find({}, {"id_offre": 1})]
-    
-    if not profil_ids or not offre_ids:
-        print("⚠ No profils or offres found. Seed those first!")
+_worker = {}
+
+def init_worker(seed, as_of, profil_map=None, n_offres=0):
+    _worker.update(
+        db=MongoClient(MONGODB_URI)[DATABASE_NAME],
+        seed=seed,
+        as_of=as_of,
+        pools=build_pools(seed),
+        profil_map=profil_map,
+        n_offres=n_offres,
+    )
+
+def seed_chunk(task):
+    """task = (collection, chunk, start, count) → (collection, start, count, csp codes, wilaya codes)"""
+    collection, chunk, start, count = task
+    rng = chunk_rng(_worker["seed"], collection, chunk)
+    as_of, pools = _worker["as_of"], _worker["pools"]
+    csp_codes = wilaya_codes = None
+
+    if collection == "profils":
+        docs = [generate_profil(rng, i, pools, as_of) for i in range(start, start + count)]
+        docs = [{**doc, **encode_profil(doc)} for doc in docs]  # interned label ids (cached)
+        csp_codes = bytes(CSP_CATEGORIES.index(d["csp"]) for d in docs)
+        wilaya_codes = bytes(WILAYAS.index(d["wilaya"]) for d in docs)
+        count_new = count_new_profils
+    elif collection == "offres":
+        docs = [generate_offre(rng, i, pools, as_of) for i in range(start, start + count)]
+        docs = [{**doc, **encode_offre(doc)} for doc in docs]
+        count_new = count_new_offres
+    else:
+        docs = [
+            generate_placement(rng, i, _worker["profil_map"], _worker["n_offres"], as_of)
+            for i in range(start, start + count)
+        ]
+        count_new = count_new_placements
+
+    _worker["db"][collection].insert_many(docs, ordered=False)
+    count_new(docs)  # market_counters ($inc, safe across workers)
+    return collection, start, count, csp_codes, wilaya_codes
+
+def plan_chunks(collection: str, total: int, chunk_size: int) -> list:
+    return [
+        (collection, k, start, min(chunk_size, total - start))
+        for k, start in enumerate(range(0, total, chunk_size))
+    ]
+
+def run_chunks(tasks: list, workers: int, init_args: tuple):
+    """Yield chunk results as they complete (in-process when workers == 1)"""
+    if workers <= 1:
+        init_worker(*init_args)
+        for task in tasks:
+            yield seed_chunk(task)
         return
-    
-    docs = []
-    for _ in range(count):
-        profil_id = choice(profil_ids)
-        profil = db.profils.find_one({"id_demandeur": profil_id})
-        csp = profil["csp"] if profil else choice(CSP_CATEGORIES)
-        
-        docs.append({
-            "id_placement": f"PL-{fake.uuid4()[:8].upper()}",
-            "id_demandeur": profil_id,
-            "id_offre": choice(offre_ids),
-            "csp": csp,
-            "duree_attente_jours": randint(10, 180),
-            "date_placement": to_datetime(fake.date_time_between("-24m", "now")),
-            "created_at": datetime.now(timezone.utc)
-        })
-    
-    result = db["placements"].insert_many(docs)
-    print(f"✓ Inserted {len(result.inserted_ids)} placements (linked)")
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=init_worker, initargs=init_args) as pool:
+        yield from pool.imap_unordered(seed_chunk, tasks)
+
+def report(done: Counter, totals: dict, t0: float):
+    rate = sum(done.values()) / max(time.perf_counter() - t0, 1e-9)
+    print("  " + ", ".join(f"{c}: {done[c]}/{totals[c]}" for c in totals) + f" — {rate:.0f} docs/s")
+
+def default_as_of() -> datetime:
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def seed_population(profils=300, offres=400, placements=250, seed=SEED, as_of=None,
+                    workers=1, chunk_size=CHUNK_SIZE):
+    """Profils + offres in parallel, then placements linked through the index → CSP map"""
+    as_of = as_of or default_as_of()
+    csp_of, wilaya_of = bytearray(profils), bytearray(profils)
+    t0 = time.perf_counter()
+
+    totals = {"profils": profils, "offres": offres}
+    done = Counter()
+    tasks = plan_chunks("profils", profils, chunk_size) + plan_chunks("offres", offres, chunk_size)
+    for collection, start, count, csp_codes, wilaya_codes in run_chunks(tasks, workers, (seed, as_of)):
+        if csp_codes is not None:
+            csp_of[start:start + count] = csp_codes
+            wilaya_of[start:start + count] = wilaya_codes
+        done[collection] += count
+        report(done, totals, t0)
+    print(f"✓ Inserted {profils} profils and {offres} offres")
+    for csp, code in zip(CSP_CATEGORIES, range(len(CSP_CATEGORIES))):
+        print(f"    {csp}: {csp_of.count(code)} profils")
+
+    if not profils or not offres:
+        print("⚠ No profils or offres generated: placements skipped")
+        return
+    totals, done = {"placements": placements}, Counter()
+    init_args = (seed, as_of, (bytes(csp_of), bytes(wilaya_of)), offres)
+    for collection, start, count, _, _ in run_chunks(plan_chunks("placements", placements, chunk_size), workers, init_args):
+        done[collection] += count
+        report(done, totals, t0)
+    print(f"✓ Inserted {placements} placements (linked) in {time.perf_counter() - t0:.1f}s")
 
 # ────────────────────────────────────────────────
 # MAIN
 # ────────────────────────────────────────────────
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a synthetic ANEM population")
+    parser.add_argument("--profils", type=int, default=300)
+    parser.add_argument("--offres", type=int, default=400)
+    parser.add_argument("--placements", type=int, default=250)
+    parser.add_argument("--referentiels", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--as-of", help="reference date YYYY-MM-DD (default: today); fixes every generated date")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="documents per chunk; part of the seed (another value generates another population)")
+    parser.add_argument("--keep", action="store_true", help="don't clear the collections first (ids are index-based: profils/offres/placements must be empty)")
+    args = parser.parse_args()
+    as_of = (
+        datetime.strptime(args.as_of, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.as_of
+        else default_as_of()
+    )
+
     print("\n🌱 Starting ANEM Employabilité Database Seeding...\n")
     
-    # Comment this line if you want to keep existing data
-    clear_collections()
+    if not args.keep:
+        clear_collections()
     
     print("\n1️⃣ Seeding Referentiels...")
-    seed_referentiels(count=120)
-    
-    print("\n2️⃣ Seeding Profils...")
-    seed_profils(count=300)
-    
-    print("\n3️⃣ Seeding Offres...")
-    seed_offres(count=400)
+    seed_referentiels(count=args.referentiels, seed=args.seed, as_of=as_of)
     
-    print("\n4️⃣ Seeding Placements...")
-    seed_placements(count=250)
+    print("\n2️⃣ Seeding Profils, Offres and Placements...")
+    seed_population(args.profils, args.offres, args.placements, args.seed, as_of, args.workers, args.chunk_size)
     
-    print("\n🎉 Full coherent population seeded! Ready for scoring & agents.\n")
\ No newline at end of file
+    print("\n🎉 Full coherent population seeded! Ready for scoring & agents.\n")
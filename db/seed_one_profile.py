@@ -2,6 +2,7 @@ from pymongo import MongoClient
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from scoring.market_counters import count_new_profils
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
@@ -28,6 +29,7 @@ profil = {
 }
 
 result = db.profils.insert_one(profil)
+count_new_profils([profil])
 print("Inserted profil with ID:", result.inserted_id)
 
 # Quick check
@@ -1,36 +1,203 @@
-from .full_te import compute_full_te
-from pymongo import MongoClient
+"""
+Batch scoring of all profils.
+Run: python -m scoring.batch_scoring [--resume | --pending] [--page-size 500]
+
+Walks profils in _id order, one page at a time (short-lived cursors, no
+CursorNotFound on big collections), scores the page in memory, flushes it with
+one bulk write and records a checkpoint in batch_runs. Score distributions
+are accumulated in quantile sketches (scoring/score_sketches.py) and published
+when the run finishes. --resume claims the
+last failed run, or a running one without checkpoint for STALE_S (process
+killed, node lost), atomically: two --resume never continue the same run and a
+live run is never joined. It continues from the run's checkpoint. --pending
+only rescores the CSPs affected by a change of the scoring tables (see
+scoring/tables.py).
+"""
+
+from .full_te import combine_te, save_scores
+from .resource_score import score_resources, RESOURCE_FIELDS
+from .market_score import compute_market_score
+from .score_history import downsample_history
+from .tables import refresh_tables, pending_rescore, clear_pending_rescore
+from .dashboard_summary import refresh_dashboard_summary
+from .market_counters import reconcile_counters
+from .score_sketches import add_to_sketches, publish_sketches
+from pymongo import MongoClient, ReturnDocument
 from dotenv import load_dotenv
+from datetime import datetime, timezone, timedelta
+import argparse
 import os
+import time
+import uuid
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]
 
-def score_and_save_all(batch_size=50):
-    cursor = db.profils.find({}, {"id_demandeur": 1})
-    updated = 0
-    
-    for p in cursor:
-        result = compute_full_te(p["id_demandeur"], save_to_db=True)
-        if "full_te" in result:
-            updated += 1
-        
-        if updated % batch_size == 0 and updated > 0:
-            print(f"Updated {updated} profiles...")
-    
-    print(f"Finished: {updated} profiles scored and saved.")
+PAGE_FIELDS = {**RESOURCE_FIELDS, "full_te": 1}
+STALE_S = 600   # a running run without checkpoint for this long is dead (checkpoint = heartbeat)
+
+# ────────────────────────────────────────────────
+# CHECKPOINTS (batch_runs)
+# ────────────────────────────────────────────────
+
+def start_run(page_size: int, csps: list = None) -> dict:
+    now = datetime.now(timezone.utc)
+    run = {
+        "_id": uuid.uuid4().hex,
+        "status": "running",
+        "started_at": now,
+        "updated_at": now,
+        "page_size": page_size,
+        "csps": csps,
+        "clears_pending": csps or pending_rescore(),  # table changes covered by this run
+        "total_estimate": (
+            db.profils.count_documents({"csp": {"$in": csps}}) if csps
+            else db.profils.estimated_document_count()
+        ),
+        "last_id": None,
+        "pages": 0,
+        "scored": 0,
+        "errors": 0,
+    }
+    db.batch_runs.insert_one(run)
+    return run
+
+def claim_failed_run():
+    """Atomically move the last failed or stale run back to running → run, or None"""
+    t = datetime.now(timezone.utc)
+    return db.batch_runs.find_one_and_update(
+        {"$or": [
+            {"status": "failed"},
+            {"status": "running", "updated_at": {"$lt": t - timedelta(seconds=STALE_S)}},
+        ]},
+        {"$set": {"status": "running", "resumed_at": t, "updated_at": t}},
+        sort=[("started_at", -1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def checkpoint(run: dict, **fields):
+    fields["updated_at"] = datetime.now(timezone.utc)
+    run.update(fields)
+    db.batch_runs.update_one({"_id": run["_id"]}, {"$set": fields})
+
+# ────────────────────────────────────────────────
+# SCORING
+# ────────────────────────────────────────────────
+
+def score_page(profils: list, market_scores: dict):
+    """Score one page in memory → (results, previous full_te per profil, errors)"""
+    results, previous_te, errors = [], {}, 0
+    for p in profils:
+        res = score_resources(p)
+        if "error" in res:
+            errors += 1
+            continue
+
+        csp = res["csp"]
+        if csp not in market_scores:  # market score is per CSP: once per run
+            market_scores[csp] = compute_market_score(csp)
+
+        results.append(combine_te(p["id_demandeur"], res, market_scores[csp]))
+        previous_te[p["id_demandeur"]] = p.get("full_te")
+    return results, previous_te, errors
+
+def rebuild_prototypes():
+    """Recommendation prototypes of the CSPs whose optimal set moved (agents/prototypes.py)"""
+    from agents.prototypes import rebuild_stale_prototypes  # agents build on scoring, not the reverse
+    return rebuild_stale_prototypes()
+
+def score_and_save_all(batch_size=500, resume=False, csps=None):
+    """Score every profil (or only those of `csps`), checkpointing after each page"""
+    run = claim_failed_run() if resume else None
+    if run:
+        print(f"Reprise du run {run['_id']} après {run['scored']} profils (last _id {run['last_id']})")
+    else:
+        if resume:
+            print("Aucun run en échec ou interrompu à reprendre — nouveau run")
+        reconcile_counters()  # fresh run: repair counter drift before market scores are read
+        run = start_run(batch_size, csps)
+
+    page_size = run.get("page_size", batch_size)
+    base_query = {"csp": {"$in": run["csps"]}} if run.get("csps") else {}
+    refresh_tables()
+    market_scores = {}
+    done_before = run["scored"] + run["errors"]
+    t0 = time.perf_counter()
+
+    try:
+        while True:
+            if refresh_tables():  # one version check per page
+                market_scores.clear()
+            query = dict(base_query)
+            if run["last_id"] is not None:
+                query["_id"] = {"$gt": run["last_id"]}
+            page = list(db.profils.find(query, PAGE_FIELDS).sort("_id", 1).limit(page_size))
+            if not page:
+                break
+
+            page_start = time.perf_counter()
+            results, previous_te, errors = score_page(page, market_scores)
+            save_scores(results, previous_te)
+            add_to_sketches(run["_id"], results, page[0]["_id"])  # before the checkpoint: a crash re-scores the page
+
+            checkpoint(
+                run,
+                last_id=page[-1]["_id"],
+                pages=run["pages"] + 1,
+                scored=run["scored"] + len(results),
+                errors=run["errors"] + errors,
+            )
+
+            processed = run["scored"] + run["errors"]
+            rate = (processed - done_before) / max(time.perf_counter() - t0, 1e-9)
+            remaining = max(run["total_estimate"] - processed, 0)
+            eta = remaining / rate if rate > 0 else 0
+            print(
+                f"Page {run['pages']}: {len(page)} profils en {time.perf_counter() - page_start:.2f}s"
+                f" — {processed}/{run['total_estimate']} ({rate:.0f} profils/s, ETA {eta:.0f}s)"
+            )
+    except BaseException:
+        checkpoint(run, status="failed")
+        raise
+
+    checkpoint(run, status="done", finished_at=datetime.now(timezone.utc))
+    print(f"Finished: {run['scored']} profiles scored and saved ({run['errors']} errors).")
+    clear_pending_rescore(run.get("clears_pending", []))
+    publish_sketches(run["_id"], run.get("csps"))
+    rebuild_prototypes()
+    downsample_history()
+    refresh_dashboard_summary()
+    return run
+
+def rescore_pending(batch_size=500):
+    """Targeted rescoring of the CSPs touched by a scoring-table change"""
+    csps = pending_rescore()
+    if not csps:
+        print("Aucune CSP à rescorer.")
+        return None
+    print(f"Rescoring ciblé: {', '.join(csps)}")
+    return score_and_save_all(batch_size=batch_size, csps=csps)
 
 def show_top_optimale(limit=10):
     top = db.profils.find(
         {"te_classification": "Employabilité Optimale"},
-        {"id_demandeur": 1, "csp": 1, "full_te": 1}
+        {"_id": 0, "id_demandeur": 1, "csp": 1, "full_te": 1}  # covered by the index
     ).sort("full_te", -1).limit(limit)
-    
+
     print(f"\nTop {limit} Optimale:")
     for p in top:
         print(f"{p['id_demandeur']} ({p.get('csp')}): {p.get('full_te')}%")
 
 if __name__ == "__main__":
-    score_and_save_all()
-    show_top_optimale()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Score and save all profils")
+    parser.add_argument("--resume", action="store_true", help="continue the last failed or interrupted run")
+    parser.add_argument("--pending", action="store_true", help="only rescore CSPs affected by a table change")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.pending:
+        rescore_pending(batch_size=args.page_size)
+    else:
+        score_and_save_all(batch_size=args.page_size, resume=args.resume)
+    show_top_optimale()
@@ -0,0 +1,104 @@
+
+"""
+Precomputed summaries for the monitoring dashboard (dashboard/app.py).
+Refreshed at the end of each batch run; the dashboard only reads these
+few small documents (one per section, keyed by _id) from dashboard_summary.
+Counts, means and classes come from the score sketches the run has just
+published and from market_counters, never from an aggregation over profils.
+Run: python -m scoring.dashboard_summary
+"""
+
+from .market_score import compute_market_score
+from .tables import get_tables
+from .score_sketches import quantiles, current_sketches, bin_of, N_BINS, RESOLUTION
+from .resource_score import classify_te
+from .optimal_set import OPTIMAL_THRESHOLD
+from .market_counters import get_counters
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+from collections import defaultdict, Counter
+import numpy as np
+import os
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+SUMMARY_COLLECTION = "dashboard_summary"
+TOP_LIMIT = 50
+
+BIN_VALUES = np.round(np.arange(N_BINS) * RESOLUTION, 1)
+BIN_CLASSES = [classify_te(v) for v in BIN_VALUES]
+
+def classification_summary() -> list:
+    by_csp = defaultdict(Counter)
+    for (csp, _), (_, counts) in current_sketches("full_te").items():
+        for b in np.flatnonzero(counts):
+            by_csp[csp][BIN_CLASSES[b]] += int(counts[b])
+    for csp in get_tables()["csp_categories"]:
+        unscored = get_counters(csp)["demand"] - sum(by_csp[csp].values())
+        if unscored > 0:
+            by_csp[csp]["Non scoré"] += unscored
+    return [
+        {"csp": csp, "classification": cls, "count": n}
+        for csp in sorted(by_csp) for cls, n in sorted(by_csp[csp].items()) if n
+    ]
+
+def csp_wilaya_summary() -> list:
+    optimal_bin = bin_of(OPTIMAL_THRESHOLD)
+    rows = []
+    for (csp, wilaya), (n, counts) in current_sketches("full_te").items():
+        total = counts.sum()
+        rows.append({
+            "csp": csp,
+            "wilaya": wilaya,
+            "profils": n,
+            "te_moyen": round(float(counts @ BIN_VALUES / total), 1) if total else None,
+            "optimale": int(counts[optimal_bin:].sum()),
+        })
+    return sorted(rows, key=lambda r: (r["csp"], r["wilaya"] or ""))
+
+def market_summary() -> list:
+    return [compute_market_score(csp) for csp in get_tables()["csp_categories"]]
+
+def weights_summary() -> list:
+    tables = get_tables()
+    return [
+        {"csp": csp, **tables["weights_resources"][csp], "version": tables["weight_versions"].get(csp, 0)}
+        for csp in tables["csp_categories"]
+    ]
+
+def percentiles_summary() -> list:
+    # from the published quantile sketches, no sort over profils
+    return [{"csp": csp, **quantiles(csp=csp)} for csp in get_tables()["csp_categories"]]
+
+def top_optimale_summary(limit: int = TOP_LIMIT) -> list:
+    # same covered query as show_top_optimale
+    return list(db.profils.find(
+        {"te_classification": "Employabilité Optimale"},
+        {"_id": 0, "id_demandeur": 1, "csp": 1, "full_te": 1}
+    ).sort("full_te", -1).limit(limit))
+
+SECTIONS = {
+    "classification": classification_summary,
+    "csp_wilaya": csp_wilaya_summary,
+    "market": market_summary,
+    "weights": weights_summary,
+    "percentiles": percentiles_summary,
+    "top_optimale": top_optimale_summary,
+}
+
+def refresh_dashboard_summary():
+    now = datetime.now(timezone.utc)
+    for key, build in SECTIONS.items():
+        db[SUMMARY_COLLECTION].replace_one(
+            {"_id": key},
+            {"data": build(), "updated_at": now},
+            upsert=True
+        )
+    print(f"✓ Dashboard summary refreshed ({len(SECTIONS)} sections)")
+
+
+if __name__ == "__main__":
+    refresh_dashboard_summary()
@@ -2,22 +2,20 @@
 from .resource_score import compute_resources_score
 from .market_score import compute_market_score
 from .resource_score import classify_te 
-from pymongo import MongoClient
+from .score_history import record_snapshot, record_snapshots
+from .optimal_set import crossed_threshold, bump_optimal_version
+from .tables import get_tables
+from .score_sketches import te_percentile, classify_percentile
+from pymongo import MongoClient, ReturnDocument, UpdateOne
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from collections import Counter
 import os
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]
 
-WEIGHTS_RES_MARKET = {  # keep here or move to a constants.py
-    "Management": {"resources": 80, "market": 20},
-    "Personnel professionnel": {"resources": 50, "market": 50},
-    "Encadrement de support": {"resources": 40, "market": 60},
-    "Personnel d'aide": {"resources": 10, "market": 90},
-}
-
 def compute_full_te(profil_id: str, save_to_db: bool = False):
     res = compute_resources_score(profil_id)
     if "error" in res:
@@ -27,29 +25,84 @@ def compute_full_te(profil_id: str, save_to_db: bool = False):
     if "error" in mkt:
         return mkt
     
+    result = combine_te(profil_id, res, mkt)
+    
+    if save_to_db:
+        previous = db.profils.find_one_and_update(
+            {"id_demandeur": profil_id},
+            {"$set": score_fields(result)},
+            projection={"full_te": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous and crossed_threshold(previous.get("full_te"), result["full_te"]):
+            bump_optimal_version(result["csp"])
+        record_snapshot(result)
+    
+    return result
+
+def combine_te(profil_id: str, res: dict, mkt: dict, tables=None, rank=te_percentile) -> dict:
+    """
+    Full TE from an already computed resources score and market score.
+    tables / rank (csp, full_te → percentile) default to the live ones;
+    offline scoring passes those of a snapshot.
+    """
     csp = res["csp"]
+    weights = (tables or get_tables())["weights_res_market"][csp]
     full_te = (
-        res["resources_score"] * WEIGHTS_RES_MARKET[csp]["resources"] / 100 +
-        mkt["market_score"] * WEIGHTS_RES_MARKET[csp]["market"] / 100
+        res["resources_score"] * weights["resources"] / 100 +
+        mkt["market_score"] * weights["market"] / 100
     )
+    percentile = rank(csp, full_te)
     
-    result = {
+    return {
         "profil_id": profil_id,
         "csp": csp,
+        "wilaya": res.get("wilaya"),
+        "savoir_norm": res["savoir_norm"],
+        "savoir_faire_norm": res["savoir_faire_norm"],
+        "savoir_etre_norm": res["savoir_etre_norm"],
+        "weights_version": res.get("weights_version", 0),
         "resources_score": round(res["resources_score"], 1),
         "market_score": round(mkt["market_score"], 1),
         "full_te": round(full_te, 1),
-        "classification": classify_te(full_te)
+        "classification": classify_te(full_te),
+        "percentile": percentile,                            # rank within the CSP (last published run)
+        "classification_pct": classify_percentile(percentile),
     }
+
+def score_fields(result: dict) -> dict:
+    """Fields written on the profil document"""
+    return {
+        "full_te": result["full_te"],
+        "te_classification": result["classification"],
+        "te_percentile": result.get("percentile"),
+        "te_classification_pct": result.get("classification_pct"),
+        "resources": {  # sub-scores, read by the weighting agent
+            "savoir_norm": result["savoir_norm"],
+            "savoir_faire_norm": result["savoir_faire_norm"],
+            "savoir_etre_norm": result["savoir_etre_norm"],
+            "resources_score": result["resources_score"]
+        },
+        "weights_version": result["weights_version"],  # dynamic weights used (0 = referentiel)
+        "last_scored": datetime.now(timezone.utc)
+    }
+
+def save_scores(results: list, previous_te: dict):
+    """
+    Bulk version of save_to_db for batch jobs: one unordered bulk_write per page.
+    previous_te maps profil_id → full_te read with the page (threshold crossings).
+    """
+    if not results:
+        return
+    db.profils.bulk_write([
+        UpdateOne({"id_demandeur": r["profil_id"]}, {"$set": score_fields(r)})
+        for r in results
+    ], ordered=False)
     
-    if save_to_db:
-        db.profils.update_one(
-            {"id_demandeur": profil_id},
-            {"$set": {
-                "full_te": result["full_te"],
-                "te_classification": result["classification"],
-                "last_scored": datetime.now(timezone.utc)
-            }}
-        )
-    
-    return result
\ No newline at end of file
+    crossings = Counter(
+        r["csp"] for r in results
+        if crossed_threshold(previous_te.get(r["profil_id"]), r["full_te"])
+    )
+    for csp, n in crossings.items():
+        bump_optimal_version(csp, n)
+    record_snapshots(results)
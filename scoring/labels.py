@@ -0,0 +1,176 @@
+
+"""
+Canonical label interning: skills, soft skills, diploma levels and CSP labels
+mapped to small integer ids, stored in referentiels as
+{"type": "label", "kind", "label_id", "libelle", "norm"}.
+
+Labels are matched on their normalised form (NFC, trimmed, single spaces,
+casefold), so "Python", " python " and "PYTHON" share one id. Each kind is
+loaded once per process into a dict; new labels are interned on first sight,
+concurrent processes being arbitrated by the partial unique index on
+(type, kind, norm), created here before the first insert.
+"""
+
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import os
+import unicodedata
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+# kind → code prefix
+KINDS = {
+    "competence": "COMP",      # competences_techniques.nom, offres.competences_requises, experiences.competences
+    "soft_skill": "SOFT",
+    "niveau_etude": "NIVL",
+    "csp": "CSPL",
+}
+
+_ids = {}      # kind → {norm: id}
+_labels = {}   # kind → {id: libelle}
+
+_indexes_ready = False
+
+def ensure_label_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # one id per normalised libelle (DuplicateKeyError in intern() relies on it)
+    db.referentiels.create_index(
+        [("type", 1), ("kind", 1), ("norm", 1)], unique=True,
+        partialFilterExpression={"type": "label"}
+    )
+    _indexes_ready = True
+
+def normalize_label(libelle) -> str:
+    return " ".join(unicodedata.normalize("NFC", str(libelle)).split()).casefold()
+
+def _load(kind: str):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown label kind: {kind}")
+    if kind in _ids:
+        return
+    docs = db.referentiels.find({"type": "label", "kind": kind}, {"label_id": 1, "libelle": 1, "norm": 1})
+    _ids[kind], _labels[kind] = {}, {}
+    for d in docs:
+        _ids[kind][d["norm"]] = d["label_id"]
+        _labels[kind][d["label_id"]] = d["libelle"]
+
+def _next_id(kind: str) -> int:
+    seq = db.referentiels.find_one_and_update(
+        {"type": "sequence", "code": f"label_{kind}"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return seq["seq"]
+
+def intern(kind: str, libelle: str) -> int:
+    _load(kind)
+    norm = normalize_label(libelle)
+    if norm in _ids[kind]:
+        return _ids[kind][norm]
+
+    ensure_label_indexes()
+    label_id = _next_id(kind)
+    try:
+        db.referentiels.insert_one({
+            "type": "label",
+            "code": f"{KINDS[kind]}-{label_id:05d}",
+            "kind": kind,
+            "label_id": label_id,
+            "libelle": " ".join(str(libelle).split()),
+            "norm": norm,
+            "created_at": datetime.now(timezone.utc),
+        })
+    except DuplicateKeyError:  # interned concurrently by another process
+        doc = db.referentiels.find_one({"type": "label", "kind": kind, "norm": norm})
+        label_id, libelle = doc["label_id"], doc["libelle"]
+
+    _ids[kind][norm] = label_id
+    _labels[kind][label_id] = libelle
+    return label_id
+
+def encode(kind: str, libelles) -> list:
+    """Sorted, duplicate-free id list"""
+    return sorted({intern(kind, l) for l in libelles if l})
+
+def label_of(kind: str, label_id: int) -> str:
+    _load(kind)
+    if label_id not in _labels[kind]:
+        _ids.pop(kind)  # interned by another process since we loaded
+        _load(kind)
+    return _labels[kind].get(label_id, str(label_id))
+
+def distinct_competences(comps: list) -> list:
+    """One entry per normalised skill name, without interning (no DB access)"""
+    best = {}
+    for c in comps or []:
+        norm = normalize_label(c.get("nom"))
+        if norm and (norm not in best or (c.get("etoiles") or 0) > (best[norm].get("etoiles") or 0)):
+            best[norm] = c
+    return list(best.values())
+
+def distinct_labels(libelles) -> list:
+    """First spelling of each normalised label, in order (same rule as the ids)"""
+    seen = {}
+    for l in libelles or []:
+        if l:
+            seen.setdefault(normalize_label(l), l)
+    return list(seen.values())
+
+def dedupe_competences(comps: list) -> list:
+    """One entry per skill (best etoiles kept), each tagged with its id"""
+    best = {}
+    for c in comps or []:
+        if not c.get("nom"):
+            continue
+        cid = intern("competence", c["nom"])
+        if cid not in best or (c.get("etoiles") or 0) > (best[cid].get("etoiles") or 0):
+            best[cid] = {**c, "id": cid}
+    return [best[cid] for cid in sorted(best)]
+
+# ────────────────────────────────────────────────
+# DOCUMENT ENCODERS (fields to $set)
+# ────────────────────────────────────────────────
+
+def encode_profil(profil: dict) -> dict:
+    comps = dedupe_competences(profil.get("competences_techniques", []))
+    soft_skills = distinct_labels(profil.get("soft_skills", []))
+    fields = {
+        "competences_techniques": comps,
+        "comp_ids": [c["id"] for c in comps],
+        "soft_skills": soft_skills,
+        "soft_ids": encode("soft_skill", soft_skills),
+        "diplomes": [
+            {**d, "niveau_id": intern("niveau_etude", d["niveau"])} if d.get("niveau") else d
+            for d in profil.get("diplomes", [])
+        ],
+        "experiences": [
+            {
+                **e,
+                "competences": distinct_labels(e.get("competences", [])),
+                "competence_ids": encode("competence", e.get("competences", [])),
+            }
+            for e in profil.get("experiences", [])
+        ],
+    }
+    if profil.get("csp"):
+        fields["csp_id"] = intern("csp", profil["csp"])
+    return fields
+
+def encode_offre(offre: dict) -> dict:
+    required = distinct_labels(offre.get("competences_requises", []))
+    fields = {
+        "competences_requises": required,
+        "comp_ids": encode("competence", required),
+    }
+    if offre.get("niveau_etude_min"):
+        fields["niveau_min_id"] = intern("niveau_etude", offre["niveau_etude_min"])
+    if offre.get("csp"):
+        fields["csp_id"] = intern("csp", offre["csp"])
+    return fields
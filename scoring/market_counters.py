@@ -0,0 +1,143 @@
+
+"""
+Per-CSP market counters: one small document per CSP in market_counters
+  {_id: csp, demand, open_offers, duree_sum, duree_count}
+kept up to date by the write paths with atomic $inc (seeding, ingestion,
+offer status changes, placements), so tension and duration scores are O(1)
+reads. reconcile_counters() recomputes them from the collections to repair drift
+and writes a (possibly zero) document for every CSP of the scoring tables.
+Run: python -m scoring.market_counters [reconcile]
+"""
+
+from .placement_rollups import add_placements
+from .tables import get_tables
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+from collections import Counter
+import os
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+OPEN_STATUSES = ["Ouverte", "En cours"]
+COUNTER_FIELDS = ["demand", "open_offers", "duree_sum", "duree_count"]
+
+def is_open(statut) -> bool:
+    return statut in OPEN_STATUSES
+
+# ────────────────────────────────────────────────
+# WRITES ($inc)
+# ────────────────────────────────────────────────
+
+def inc_counters(increments: dict):
+    """increments: {csp: {field: delta}} → one unordered bulk of upserting $inc"""
+    ops = [
+        UpdateOne(
+            {"_id": csp},
+            {"$inc": deltas, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        for csp, deltas in increments.items() if csp and any(deltas.values())
+    ]
+    if ops:
+        db.market_counters.bulk_write(ops, ordered=False)
+
+def count_new_profils(profils: list):
+    inc_counters({csp: {"demand": n} for csp, n in Counter(p.get("csp") for p in profils).items()})
+
+def count_new_offres(offres: list):
+    opened = Counter(o.get("csp") for o in offres if is_open(o.get("statut")))
+    inc_counters({csp: {"open_offers": n} for csp, n in opened.items()})
+
+def count_new_placements(placements: list):
+    increments = {}
+    for p in placements:
+        deltas = increments.setdefault(p.get("csp"), {"duree_sum": 0, "duree_count": 0})
+        deltas["duree_sum"] += p.get("duree_attente_jours", 0)
+        deltas["duree_count"] += 1
+    inc_counters(increments)
+    add_placements(placements)  # monthly waiting-time buckets (scoring/placement_rollups.py)
+
+def set_offre_statut(id_offre: str, statut: str):
+    """Change an offer's status and keep open_offers in sync"""
+    before = db.offres.find_one_and_update(
+        {"id_offre": id_offre},
+        {"$set": {"statut": statut}},
+        projection={"csp": 1, "statut": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    delta = int(is_open(statut)) - int(is_open(before.get("statut")))
+    if delta:
+        inc_counters({before.get("csp"): {"open_offers": delta}})
+    return before
+
+# ────────────────────────────────────────────────
+# READS
+# ────────────────────────────────────────────────
+
+def get_counters(csp: str) -> dict:
+    doc = db.market_counters.find_one({"_id": csp})
+    if doc is None:  # never counted (fresh DB): build all counters once
+        reconcile_counters(verbose=False)
+        doc = db.market_counters.find_one({"_id": csp})
+    if doc is None:  # CSP outside the tables: zero doc, so the next read does not reconcile again
+        doc = db.market_counters.find_one_and_update(
+            {"_id": csp},
+            {"$setOnInsert": {**{f: 0 for f in COUNTER_FIELDS}, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    return {f: doc.get(f, 0) for f in COUNTER_FIELDS}
+
+# ────────────────────────────────────────────────
+# RECONCILIATION
+# ────────────────────────────────────────────────
+
+def reconcile_counters(verbose: bool = True) -> dict:
+    """Recompute every counter from profils/offres/placements; returns the drift per CSP"""
+    actual = {}
+    for r in db.profils.aggregate([{"$group": {"_id": "$csp", "n": {"$sum": 1}}}]):
+        actual.setdefault(r["_id"], {})["demand"] = r["n"]
+    for r in db.offres.aggregate([
+        {"$match": {"statut": {"$in": OPEN_STATUSES}}},
+        {"$group": {"_id": "$csp", "n": {"$sum": 1}}}
+    ]):
+        actual.setdefault(r["_id"], {})["open_offers"] = r["n"]
+    for r in db.placements.aggregate([
+        {"$group": {"_id": "$csp", "s": {"$sum": "$duree_attente_jours"}, "n": {"$sum": 1}}}
+    ]):
+        actual.setdefault(r["_id"], {}).update({"duree_sum": r["s"], "duree_count": r["n"]})
+
+    current = {d["_id"]: d for d in db.market_counters.find()}
+    drift, ops = {}, []
+    for csp in set(actual) | set(current) | set(get_tables()["csp_categories"]):
+        if csp is None:
+            continue
+        values = {f: actual.get(csp, {}).get(f, 0) for f in COUNTER_FIELDS}
+        diff = {f: values[f] - current.get(csp, {}).get(f, 0) for f in COUNTER_FIELDS}
+        diff = {f: d for f, d in diff.items() if d}
+        if diff:
+            drift[csp] = diff
+        ops.append(UpdateOne(
+            {"_id": csp},
+            {"$set": {**values, "updated_at": datetime.now(timezone.utc), "reconciled_at": datetime.now(timezone.utc)}},
+            upsert=True
+        ))
+    if ops:
+        db.market_counters.bulk_write(ops, ordered=False)
+
+    if verbose:
+        print(f"Compteurs réconciliés ({len(ops)} CSP)" + (f" — dérive: {drift}" if drift else " — aucune dérive"))
+    return drift
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile":
+        reconcile_counters()
+    for doc in db.market_counters.find():
+        print(doc)
@@ -1,60 +1,53 @@
 
 """
 Market Score computation: tension offre/demande + durée attente moyenne
-Uses data from offres and placements collections.
+Tension uses the per-CSP counters of market_counters (kept in sync with
+profils and offres, see scoring/market_counters.py): O(1) per call.
+Durée uses the last monthly placement buckets with a decay
+(scoring/placement_rollups.py): constant cost as placements accumulate.
 """
 
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+from .tables import get_tables
+from .market_counters import get_counters
+from .placement_rollups import decayed_avg_duree, DUREE_WINDOW_MONTHS, DUREE_DECAY
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]  # change if your DB name is different
 
-WEIGHTS_MARKET = {
-    "Management": {"tension": 0.7, "duree": 0.3},
-    "Personnel professionnel": {"tension": 0.5, "duree": 0.5},
-    "Encadrement de support": {"tension": 0.6, "duree": 0.4},
-    "Personnel d'aide": {"tension": 0.3, "duree": 0.7},
-}
-
 def get_tension_score(csp: str) -> float:
-    num_demands = db.profils.count_documents({"csp": csp})
-    num_offers = db.offres.count_documents({
-        "csp": csp,
-        "statut": {"$in": ["Ouverte", "En cours"]}
-    })
+    counters = get_counters(csp)
+    num_demands = counters["demand"]
+    num_offers = counters["open_offers"]
     
     if num_demands == 0:
         return 0.0
     
     ratio = num_offers / num_demands
     return min(100.0, 100 * ratio / (1 + ratio))  # sigmoid: slower rise, maxes at 100 only if ratio very high  # was 50, now 25 → needs ratio ≥4 for 100
-def get_duree_score(csp: str) -> float:
+def get_duree_score(csp: str, months: int = DUREE_WINDOW_MONTHS, decay: float = DUREE_DECAY) -> float:
     """
-    Durée moyenne attente from placements (days)
+    Durée moyenne attente over the last `months` months of placements (days),
+    recent months weighted more (decay per month of age)
     Normalize inverse: shorter = better (0 days → 100, 180 days → 0)
     """
-    pipeline = [
-        {"$match": {"csp": csp}},
-        {"$group": {"_id": None, "avg_duree": {"$avg": "$duree_attente_jours"}}}
-    ]
-    result = list(db.placements.aggregate(pipeline))
-    
-    if not result or not result[0].get("avg_duree"):
+    avg_days = decayed_avg_duree(csp, months, decay)
+    if not avg_days:
         return 50.0  # neutral default if no data
     
-    avg_days = result[0]["avg_duree"]
     # Shorter is better: linear scale from 0 to 180 days
     return max(0.0, 100.0 - (avg_days / 180.0 * 100.0))
 
 
 def compute_market_score(csp: str) -> dict:
-    if csp not in WEIGHTS_MARKET:
+    weights_market = get_tables()["weights_market"]
+    if csp not in weights_market:
         return {"error": f"Unknown CSP: {csp}"}
     
-    weights = WEIGHTS_MARKET[csp]
+    weights = weights_market[csp]
     
     tension_norm = get_tension_score(csp)
     duree_norm = get_duree_score(csp)
@@ -75,7 +68,7 @@ def compute_market_score(csp: str) -> dict:
 # Quick test
 if __name__ == "__main__":
     # Test on each CSP
-    for csp in ["Management", "Personnel professionnel", "Encadrement de support", "Personnel d'aide"]:
+    for csp in get_tables()["csp_categories"]:
         result = compute_market_score(csp)
         print(f"\nMarket Score for {csp}:")
         print(result)
\ No newline at end of file
@@ -0,0 +1,39 @@
+
+"""
+Version stamps of the optimal set (profils with full_te >= OPTIMAL_THRESHOLD).
+One small document holds a counter per CSP plus a global one ("__all__");
+they are bumped whenever a profile crosses the threshold in either direction,
+so anything derived from the optimal set (recommendation cache, prototypes)
+knows when it is stale.
+"""
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+OPTIMAL_THRESHOLD = 70.0
+ALL_CSP = "__all__"
+VERSIONS_DOC_ID = "optimal_set"
+
+def is_optimal(te) -> bool:
+    return te is not None and te >= OPTIMAL_THRESHOLD
+
+def crossed_threshold(old_te, new_te) -> bool:
+    return is_optimal(old_te) != is_optimal(new_te)
+
+def bump_optimal_version(csp: str, crossings: int = 1):
+    """Invalidate everything built on the optimal set of this CSP (and the global one)"""
+    db.optimal_versions.update_one(
+        {"_id": VERSIONS_DOC_ID},
+        {"$inc": {csp: crossings, ALL_CSP: crossings}},
+        upsert=True
+    )
+
+def get_optimal_versions() -> dict:
+    doc = db.optimal_versions.find_one({"_id": VERSIONS_DOC_ID}) or {}
+    doc.pop("_id", None)
+    return doc
@@ -0,0 +1,165 @@
+
+"""
+Monthly placement rollups: one document per CSP, wilaya and month in
+placement_rollups {csp, wilaya, month, count, sum, min, max} (waiting days).
+
+The buckets are maintained from the placement write path: add_placements()
+(called by market_counters.count_new_placements) applies one upserting
+$inc / $min / $max per bucket, so every recorded placement is counted once,
+whatever its business date. rebuild_rollups() recomputes all buckets from
+placements and is only a repair tool. The waiting-time score combines the
+last DUREE_WINDOW_MONTHS buckets with a per-month decay: the lookup reads at
+most months × wilayas small documents, whatever the size of the history.
+Run: python -m scoring.placement_rollups [rebuild]
+"""
+
+from .score_history import month_start
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import os
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+ROLLUP_COLLECTION = "placement_rollups"
+
+UNKNOWN_WILAYA = "Inconnue"   # bucket of placements without wilaya ($merge keys cannot be null)
+
+DUREE_WINDOW_MONTHS = 12
+DUREE_DECAY = 0.85   # weight of a bucket k months old = DUREE_DECAY ** k
+
+_indexes_ready = False
+
+def ensure_rollup_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # bucket key (upserts + rebuild $merge) + windowed lookups per CSP
+    db[ROLLUP_COLLECTION].create_index([("csp", 1), ("wilaya", 1), ("month", 1)], unique=True)
+    db[ROLLUP_COLLECTION].create_index([("csp", 1), ("month", -1)])
+    _indexes_ready = True
+
+# ────────────────────────────────────────────────
+# WRITES (placement write path)
+# ────────────────────────────────────────────────
+
+def add_placements(placements: list):
+    """Fold newly inserted placements into their buckets (one unordered bulk)"""
+    buckets = {}
+    for p in placements:
+        if not p.get("csp") or p.get("date_placement") is None:
+            continue
+        days = p.get("duree_attente_jours", 0)
+        key = (p["csp"], p.get("wilaya") or UNKNOWN_WILAYA, month_start(p["date_placement"]))
+        b = buckets.setdefault(key, {"count": 0, "sum": 0, "min": days, "max": days})
+        b["count"] += 1
+        b["sum"] += days
+        b["min"], b["max"] = min(b["min"], days), max(b["max"], days)
+    if not buckets:
+        return
+
+    ensure_rollup_indexes()
+    now = datetime.now(timezone.utc)
+    db[ROLLUP_COLLECTION].bulk_write([
+        UpdateOne(
+            {"csp": csp, "wilaya": wilaya, "month": month},
+            {
+                "$inc": {"count": b["count"], "sum": b["sum"]},
+                "$min": {"min": b["min"]},
+                "$max": {"max": b["max"]},
+                "$set": {"updated_at": now},
+            },
+            upsert=True
+        )
+        for (csp, wilaya, month), b in buckets.items()
+    ], ordered=False)
+
+# ────────────────────────────────────────────────
+# REPAIR
+# ────────────────────────────────────────────────
+
+def rebuild_rollups(verbose: bool = True) -> int:
+    """Recompute every bucket from placements (repair tool: run while no placements are written)"""
+    ensure_rollup_indexes()
+    db[ROLLUP_COLLECTION].delete_many({})
+    db.placements.aggregate([
+        {"$match": {"csp": {"$ne": None}, "date_placement": {"$ne": None}}},
+        {"$lookup": {  # older placements carry no wilaya: take the profil's
+            "from": "profils",
+            "localField": "id_demandeur",
+            "foreignField": "id_demandeur",
+            "pipeline": [{"$project": {"_id": 0, "wilaya": 1}}],
+            "as": "profil"
+        }},
+        {"$group": {
+            "_id": {
+                "csp": "$csp",
+                "wilaya": {"$ifNull": ["$wilaya", {"$first": "$profil.wilaya"}, UNKNOWN_WILAYA]},
+                "month": {"$dateTrunc": {"date": "$date_placement", "unit": "month"}},
+            },
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$duree_attente_jours"},
+            "min": {"$min": "$duree_attente_jours"},
+            "max": {"$max": "$duree_attente_jours"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "csp": "$_id.csp", "wilaya": "$_id.wilaya", "month": "$_id.month",
+            "count": 1, "sum": 1, "min": 1, "max": 1,
+            "updated_at": "$$NOW",
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": ["csp", "wilaya", "month"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True)
+    n = db[ROLLUP_COLLECTION].count_documents({})
+    if verbose:
+        print(f"Rollups placements reconstruits: {n} buckets")
+    return n
+
+# ────────────────────────────────────────────────
+# WINDOWED READS
+# ────────────────────────────────────────────────
+
+def months_ago(month: datetime, now: datetime) -> int:
+    return (now.year - month.year) * 12 + now.month - month.month
+
+def shift_months(month: datetime, k: int) -> datetime:
+    y, m = divmod(month.year * 12 + month.month - 1 - k, 12)
+    return month.replace(year=y, month=m + 1)
+
+def window_buckets(csp: str, months: int = DUREE_WINDOW_MONTHS, now: datetime = None) -> list:
+    start = shift_months(month_start(now or datetime.now(timezone.utc)), months - 1)
+    return list(db[ROLLUP_COLLECTION].find(
+        {"csp": csp, "month": {"$gte": start}},
+        {"_id": 0, "wilaya": 1, "month": 1, "count": 1, "sum": 1, "min": 1, "max": 1}
+    ))
+
+def decayed_avg_duree(csp: str, months: int = DUREE_WINDOW_MONTHS, decay: float = DUREE_DECAY,
+                      now: datetime = None):
+    """Decay-weighted average waiting days over the last `months` buckets (None if no data)"""
+    now = month_start(now or datetime.now(timezone.utc))
+    total_w, total_days = 0.0, 0.0
+    for b in window_buckets(csp, months, now):
+        age = months_ago(b["month"], now)
+        if age < 0:
+            continue
+        w = decay ** age
+        total_w += w * b["count"]
+        total_days += w * b["sum"]
+    return total_days / total_w if total_w else None
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild_rollups()
+    from .tables import get_tables
+    for csp in get_tables()["csp_categories"]:
+        avg = decayed_avg_duree(csp)
+        print(f"  {csp}: " + (f"{avg:.1f} jours (fenêtre {DUREE_WINDOW_MONTHS} mois)" if avg is not None else "aucune donnée"))
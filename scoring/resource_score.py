@@ -3,57 +3,28 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime, timezone
 from typing import Dict, List, Any
+from .tables import get_tables
+from .labels import distinct_competences
 
 load_dotenv()
 client = MongoClient(os.getenv("MONGODB_URI"))
 db = client[os.getenv("DATABASE_NAME")]
 
-# Constants (from your Excel)
-CSP_CATEGORIES = ["Management", "Personnel professionnel", "Encadrement de support", "Personnel d'aide"]
-
-WEIGHTS_RESOURCES = {
-    "Management": {"savoir": 45, "savoir_faire": 30, "savoir_etre": 25},
-    "Personnel professionnel": {"savoir": 33, "savoir_faire": 50, "savoir_etre": 17},
-    "Encadrement de support": {"savoir": 34, "savoir_faire": 33, "savoir_etre": 33},
-    "Personnel d'aide": {"savoir": 0, "savoir_faire": 100, "savoir_etre": 0},
-}
-WEIGHTS_RES_MARKET = {
-    "Management": {"resources": 80, "market": 20},
-    "Personnel professionnel": {"resources": 50, "market": 50},
-    "Encadrement de support": {"resources": 40, "market": 60},
-    "Personnel d'aide": {"resources": 10, "market": 90},
-}
-SAVOIR_SCORES = {
-    "Sans diplôme": 0,
-    "Diplôme FP NIVEAU 1": 2,
-    "Diplôme FP NIVEAU 2": 3,
-    "Diplôme FP NIVEAU 3": 4,
-    "Diplôme BAC +3": 6,
-    "Diplôme Bac +5": 8,
-    "Diplôme Bac +7 et plus": 10,
-}
-
-SAVOIR_BONUS = {
-    "Diplôme FP NIVEAU 1": 1,
-    "Diplôme FP NIVEAU 2": 1,
-    "Diplôme FP NIVEAU 3": 2,
-    "Diplôme BAC +3": 2,
-    "Diplôme Bac +5": 3,
-    "Diplôme Bac +7 et plus": 3,
-}
-
+# Scoring tables (savoir scores, CSP weights) live in referentiels → scoring/tables.py
 COMP_TECH_BONUS_PER_EXTRA = 2
 
-def get_savoir_score(diplomes: List[Dict]) -> float:
+def get_savoir_score(diplomes: List[Dict], tables=None) -> float:
     if not diplomes:
         return 0.0
+    tables = tables or get_tables()
+    savoir_scores, savoir_bonus = tables["savoir_scores"], tables["savoir_bonus"]
     sorted_dipl = sorted(
         diplomes,
-        key=lambda d: SAVOIR_SCORES.get(d.get("niveau", ""), 0),
+        key=lambda d: savoir_scores.get(d.get("niveau", ""), 0),
         reverse=True
     )
-    base = SAVOIR_SCORES.get(sorted_dipl[0].get("niveau", ""), 0)
-    bonus = SAVOIR_BONUS.get(sorted_dipl[1].get("niveau", ""), 0) if len(sorted_dipl) > 1 else 0
+    base = savoir_scores.get(sorted_dipl[0].get("niveau", ""), 0)
+    bonus = savoir_bonus.get(sorted_dipl[1].get("niveau", ""), 0) if len(sorted_dipl) > 1 else 0
     return base + bonus
 
 def get_experience_score(experiences: List[Dict]) -> float:
@@ -94,6 +65,12 @@ def get_savoir_faire_score(experiences, competences_techniques) -> float:
 def get_savoir_etre_score(soft_skills: List[str]) -> float:
     return 10.0 if soft_skills else 0.0
 
+# Fields read by score_resources (projection for batch reads)
+RESOURCE_FIELDS = {
+    "id_demandeur": 1, "csp": 1, "wilaya": 1, "diplomes": 1,
+    "experiences": 1, "competences_techniques": 1, "comp_ids": 1, "soft_skills": 1,
+}
+
 def compute_resources_score(profil_id=None):
     if profil_id:
         profil = db.profils.find_one({"id_demandeur": profil_id})
@@ -103,16 +80,26 @@ def compute_resources_score(profil_id=None):
     if not profil:
         return {"error": "No profil found"}
     
+    return score_resources(profil)
+
+def score_resources(profil: dict, tables=None) -> dict:
+    """
+    Resources score of an already loaded profil document (no DB access).
+    tables defaults to get_tables(); offline scoring passes a snapshot.
+    """
+    tables = tables or get_tables()
     csp = profil.get("csp")
-    if csp not in CSP_CATEGORIES:
+    if csp not in tables["csp_categories"]:
         return {"error": f"Unknown CSP: {csp}"}
     
-    weights = WEIGHTS_RESOURCES[csp]
+    weights = tables["weights_resources"][csp]
     
-    savoir_raw = get_savoir_score(profil.get("diplomes", []))
+    savoir_raw = get_savoir_score(profil.get("diplomes", []), tables)
     savoir_norm = min(100, (savoir_raw / 13.0) * 100)
     
-    sf_raw = get_savoir_faire_score(profil.get("experiences", []), profil.get("competences_techniques", []))
+    # distinct skills only: interned ids when migrated, deduplicated names otherwise
+    comps = profil["comp_ids"] if "comp_ids" in profil else distinct_competences(profil.get("competences_techniques", []))
+    sf_raw = get_savoir_faire_score(profil.get("experiences", []), comps)
     sf_norm = min(100, (sf_raw / 32.0) * 100)
     
     se_norm = (get_savoir_etre_score(profil.get("soft_skills", [])) / 10.0) * 100
@@ -125,10 +112,12 @@ def compute_resources_score(profil_id=None):
     
     return {
         "csp": csp,
+        "wilaya": profil.get("wilaya"),
         "savoir_norm": round(savoir_norm, 1),
         "savoir_faire_norm": round(sf_norm, 1),
         "savoir_etre_norm": round(se_norm, 1),
-        "resources_score": round(resources, 1)
+        "resources_score": round(resources, 1),
+        "weights_version": tables["weight_versions"].get(csp, 0)
     }
 
 def classify_te(te_score: float) -> str:
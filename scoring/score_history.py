@@ -0,0 +1,207 @@
+
+"""
+Score history: compact snapshots of every scoring write, stored in a
+MongoDB time-series collection bucketed by profile (metaField = profil id,
+csp, wilaya).
+
+- score_history          : raw snapshots, expire after RAW_RETENTION_DAYS
+- score_history_monthly  : one document per profile and month (downsampled),
+                           expires after MONTHLY_RETENTION_DAYS
+"""
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from datetime import datetime, timezone, timedelta
+import os
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+HISTORY_COLLECTION = "score_history"
+MONTHLY_COLLECTION = "score_history_monthly"
+
+RAW_RETENTION_DAYS = 400          # raw snapshots: ~13 months
+MONTHLY_RETENTION_DAYS = 5 * 365  # monthly rollups: 5 years
+
+# Compact classification codes (full labels stay on profils)
+CLASSIFICATION_CODES = {
+    "Employabilité nulle": 0,
+    "Employabilité faible": 1,
+    "Employabilité moyenne": 2,
+    "Employabilité Optimale": 3,
+}
+
+_collections_ready = False
+
+def ensure_history_collections():
+    """Create the time-series + monthly collections and their indexes (idempotent)"""
+    global _collections_ready
+    if _collections_ready:
+        return
+
+    existing = db.list_collection_names()
+    if HISTORY_COLLECTION not in existing:
+        db.create_collection(
+            HISTORY_COLLECTION,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+            expireAfterSeconds=RAW_RETENTION_DAYS * 24 * 3600,
+        )
+    # per-profile trend: bucket lookup by meta.p, then time range
+    db[HISTORY_COLLECTION].create_index([("meta.p", 1), ("ts", 1)])
+    db[HISTORY_COLLECTION].create_index([("meta.csp", 1), ("ts", 1)])
+
+    db[MONTHLY_COLLECTION].create_index([("profil_id", 1), ("month", 1)], unique=True)
+    db[MONTHLY_COLLECTION].create_index([("csp", 1), ("month", 1)])
+    db[MONTHLY_COLLECTION].create_index([("wilaya", 1), ("month", 1)])
+    db[MONTHLY_COLLECTION].create_index("month", expireAfterSeconds=MONTHLY_RETENTION_DAYS * 24 * 3600)
+
+    _collections_ready = True
+
+def month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+# ────────────────────────────────────────────────
+# WRITES
+# ────────────────────────────────────────────────
+
+def make_snapshot(result: dict, ts: datetime = None) -> dict:
+    """Compact snapshot of a compute_full_te() result"""
+    return {
+        "ts": ts or datetime.now(timezone.utc),
+        "meta": {"p": result["profil_id"], "csp": result["csp"], "w": result.get("wilaya")},
+        "te": result["full_te"],
+        "res": result["resources_score"],
+        "mkt": result["market_score"],
+        "sav": result.get("savoir_norm"),
+        "sf": result.get("savoir_faire_norm"),
+        "se": result.get("savoir_etre_norm"),
+        "cls": CLASSIFICATION_CODES.get(result["classification"]),
+        "wv": result.get("weights_version", 0),
+    }
+
+def record_snapshot(result: dict, ts: datetime = None):
+    ensure_history_collections()
+    db[HISTORY_COLLECTION].insert_one(make_snapshot(result, ts))
+
+def record_snapshots(results: list, ts: datetime = None):
+    """Bulk version used by batch jobs (one insert per flushed page)"""
+    if not results:
+        return
+    ensure_history_collections()
+    ts = ts or datetime.now(timezone.utc)
+    db[HISTORY_COLLECTION].insert_many([make_snapshot(r, ts) for r in results], ordered=False)
+
+# ────────────────────────────────────────────────
+# DOWNSAMPLING
+# ────────────────────────────────────────────────
+
+def downsample_history(months_back: int = 1):
+    """
+    Roll raw snapshots up into one document per profile and month.
+    Re-aggregates the current month plus `months_back` previous ones
+    (only the buckets in that time range are unpacked).
+    """
+    ensure_history_collections()
+    since = month_start(datetime.now(timezone.utc))
+    for _ in range(months_back):
+        since = month_start(since - timedelta(days=1))
+
+    pipeline = [
+        {"$match": {"ts": {"$gte": since}}},
+        {"$sort": {"meta.p": 1, "ts": 1}},
+        {"$group": {
+            "_id": {"p": "$meta.p", "month": {"$dateTrunc": {"date": "$ts", "unit": "month"}}},
+            "csp": {"$last": "$meta.csp"},
+            "wilaya": {"$last": "$meta.w"},
+            "n": {"$sum": 1},
+            "te_avg": {"$avg": "$te"},
+            "te_min": {"$min": "$te"},
+            "te_max": {"$max": "$te"},
+            "te_last": {"$last": "$te"},
+            "res_avg": {"$avg": "$res"},
+            "mkt_avg": {"$avg": "$mkt"},
+            "cls_last": {"$last": "$cls"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "profil_id": "$_id.p",
+            "month": "$_id.month",
+            "csp": 1, "wilaya": 1, "n": 1,
+            "te_avg": 1, "te_min": 1, "te_max": 1, "te_last": 1,
+            "res_avg": 1, "mkt_avg": 1, "cls_last": 1,
+        }},
+        {"$merge": {
+            "into": MONTHLY_COLLECTION,
+            "on": ["profil_id", "month"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    db[HISTORY_COLLECTION].aggregate(pipeline, allowDiskUse=True)
+
+# ────────────────────────────────────────────────
+# QUERIES
+# ────────────────────────────────────────────────
+
+def get_profile_trend(profil_id: str, since: datetime = None, monthly: bool = False) -> list:
+    """
+    Employability trajectory of one profile, oldest first.
+    monthly=True reads the downsampled rollups (longer horizon, fewer points).
+    """
+    ensure_history_collections()
+    if monthly:
+        query = {"profil_id": profil_id}
+        if since:
+            query["month"] = {"$gte": month_start(since)}
+        return list(db[MONTHLY_COLLECTION].find(query, {"_id": 0}).sort("month", 1))
+
+    query = {"meta.p": profil_id}
+    if since:
+        query["ts"] = {"$gte": since}
+    return list(db[HISTORY_COLLECTION].find(query, {"_id": 0}).sort("ts", 1))
+
+def cohort_trend(group_by: str = "csp", since: datetime = None, csp: str = None) -> list:
+    """
+    Monthly cohort aggregates by CSP or wilaya, computed from the
+    per-profile monthly rollups (one small document per profile-month).
+    """
+    if group_by not in ("csp", "wilaya"):
+        raise ValueError(f"group_by must be 'csp' or 'wilaya', got {group_by}")
+
+    ensure_history_collections()
+    match = {}
+    if since:
+        match["month"] = {"$gte": month_start(since)}
+    if csp:
+        match["csp"] = csp
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {group_by: f"${group_by}", "month": "$month"},
+            "profils": {"$sum": 1},
+            "te_avg": {"$avg": "$te_last"},
+            "optimale": {"$sum": {"$cond": [{"$eq": ["$cls_last", 3]}, 1, 0]}},
+            "moyenne": {"$sum": {"$cond": [{"$eq": ["$cls_last", 2]}, 1, 0]}},
+            "faible": {"$sum": {"$cond": [{"$eq": ["$cls_last", 1]}, 1, 0]}},
+            "nulle": {"$sum": {"$cond": [{"$eq": ["$cls_last", 0]}, 1, 0]}},
+        }},
+        {"$sort": {"_id.month": 1, f"_id.{group_by}": 1}},
+    ]
+    return [
+        {group_by: r["_id"][group_by], "month": r["_id"]["month"],
+         **{k: v for k, v in r.items() if k != "_id"}}
+        for r in db[MONTHLY_COLLECTION].aggregate(pipeline)
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        for point in get_profile_trend(sys.argv[1]):
+            print(f"{point['ts']:%Y-%m-%d %H:%M}  TE {point['te']}%  (cls {point['cls']})")
+    else:
+        downsample_history()
+        for row in cohort_trend("csp"):
+            print(f"{row['month']:%Y-%m} {row['csp']}: {row['te_avg']:.1f}% ({row['profils']} profils)")
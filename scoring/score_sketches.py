@@ -0,0 +1,250 @@
+
+"""
+Score distributions per CSP and wilaya as mergeable quantile sketches.
+
+Every score is in [0, 100] and rounded to 0.1, so a fixed grid of 1001 bins is
+an exact quantile sketch of bounded size: merging two sketches is adding their
+bins. Workers write one sketch per scored page, keyed by the page
+  {run, csp, w, p, n, bins: {te: {"703": 12, ...}, res: {...}, ...}}
+so a page scored again after a crash or a lost lease overwrites its own
+sketch instead of being counted twice. When the run is finished its pages are
+merged into one document per CSP and wilaya (p: null), the page documents are
+deleted and the run is published (pointer doc _id="current").
+
+The key fields are top-level and indexed (run, csp, p, w): percentile ranks
+and quantiles read a few of these documents (one per wilaya) by index, never
+the profils collection.
+Run: python -m scoring.score_sketches [CSP]
+"""
+
+from .tables import get_tables, REFRESH_INTERVAL_S
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+from collections import defaultdict, Counter
+import numpy as np
+import os
+import time
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+SKETCH_COLLECTION = "score_sketches"
+CURRENT_ID = "current"
+RESOLUTION = 0.1
+N_BINS = int(100 / RESOLUTION) + 1
+
+_indexes_ready = False
+
+def ensure_sketch_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # page / merged sketches of a run (the pointer and merge marker docs have no run)
+    db[SKETCH_COLLECTION].create_index(
+        [("run", 1), ("csp", 1), ("p", 1), ("w", 1)], unique=True,
+        partialFilterExpression={"run": {"$exists": True}}
+    )
+    _indexes_ready = True
+
+# result field → short key in the sketch documents (same codes as score_history)
+METRICS = {
+    "full_te": "te",
+    "resources_score": "res",
+    "market_score": "mkt",
+    "savoir_norm": "sav",
+    "savoir_faire_norm": "sf",
+    "savoir_etre_norm": "se",
+}
+
+# Percentile-based classes (optional alternative to classify_te's fixed cut-offs)
+PERCENTILE_CUTS = [
+    (90, "Employabilité Optimale"),
+    (60, "Employabilité moyenne"),
+    (25, "Employabilité faible"),
+]
+
+def bin_of(value: float) -> int:
+    return min(max(int(round(value / RESOLUTION)), 0), N_BINS - 1)
+
+# ────────────────────────────────────────────────
+# WRITES (one idempotent upsert per CSP/wilaya per page)
+# ────────────────────────────────────────────────
+
+def add_to_sketches(run_id: str, results: list, page):
+    """Store the sketch of a page of combine_te() results (page: its first _id)"""
+    groups = defaultdict(lambda: {"n": 0, "bins": defaultdict(Counter)})
+    for r in results:
+        group = groups[(r["csp"], r.get("wilaya"))]
+        group["n"] += 1
+        for field, key in METRICS.items():
+            value = r.get(field)
+            if value is not None:
+                group["bins"][key][str(bin_of(value))] += 1
+
+    if groups:
+        ensure_sketch_indexes()
+        db[SKETCH_COLLECTION].bulk_write([
+            UpdateOne(
+                {"run": run_id, "csp": csp, "p": page, "w": wilaya},
+                {"$set": {"n": g["n"], "bins": {k: dict(c) for k, c in g["bins"].items()}}},
+                upsert=True
+            )
+            for (csp, wilaya), g in groups.items()
+        ], ordered=False)
+
+def merge_pages(run_id: str):
+    """
+    Sum the run's page sketches into one document per CSP/wilaya, then delete
+    the pages. Safe to re-run: the merged documents are $set, and a marker
+    written before the deletion keeps a partially deleted run from being merged again.
+    """
+    ensure_sketch_indexes()
+    pages = {"run": run_id, "p": {"$ne": None}}
+    marker = {"_id": f"merged:{run_id}"}
+    if db[SKETCH_COLLECTION].find_one(marker) is None:
+        totals = defaultdict(lambda: {"n": 0, "bins": defaultdict(Counter)})
+        for doc in db[SKETCH_COLLECTION].find(pages, {"csp": 1, "w": 1, "n": 1, "bins": 1}):
+            total = totals[(doc["csp"], doc["w"])]
+            total["n"] += doc.get("n", 0)
+            for key, bins in doc.get("bins", {}).items():
+                total["bins"][key].update(bins)
+        if totals:
+            db[SKETCH_COLLECTION].bulk_write([
+                UpdateOne(
+                    {"run": run_id, "csp": csp, "p": None, "w": wilaya},
+                    {"$set": {"n": t["n"], "bins": {k: dict(c) for k, c in t["bins"].items()}}},
+                    upsert=True
+                )
+                for (csp, wilaya), t in totals.items()
+            ], ordered=False)
+        db[SKETCH_COLLECTION].insert_one({**marker, "merged_at": datetime.now(timezone.utc)})
+    db[SKETCH_COLLECTION].delete_many(pages)
+    db[SKETCH_COLLECTION].delete_one(marker)
+
+def unfinished_runs() -> list:
+    """Batch runs and queue jobs whose sketches are still being written (failed ones can be resumed / retried)"""
+    return (db.batch_runs.distinct("_id", {"status": {"$in": ["running", "failed"]}})
+            + db.scoring_jobs.distinct("_id", {"kind": "job", "status": {"$in": ["running", "failed"]}}))
+
+def publish_sketches(run_id: str, csps: list = None) -> list:
+    """
+    Merge the run's pages and make its sketches the current ones for `csps`
+    (all CSPs the run scored by default); drop the sketches of finished runs
+    it replaces, never those of runs still in progress.
+    """
+    if csps is None:
+        csps = db[SKETCH_COLLECTION].distinct("csp", {"run": run_id})
+    if not csps:
+        return []
+    merge_pages(run_id)
+    db[SKETCH_COLLECTION].update_one(
+        {"_id": CURRENT_ID},
+        {"$set": {
+            **{f"runs.{csp}": run_id for csp in csps},
+            "updated_at": datetime.now(timezone.utc),
+        }},
+        upsert=True
+    )
+    db[SKETCH_COLLECTION].delete_many({
+        "run": {"$exists": True, "$nin": [run_id] + unfinished_runs()},  # $exists: partial index
+        "csp": {"$in": list(csps)},
+    })
+    return list(csps)
+
+# ────────────────────────────────────────────────
+# READS
+# ────────────────────────────────────────────────
+
+def current_runs() -> dict:
+    doc = db[SKETCH_COLLECTION].find_one({"_id": CURRENT_ID}) or {}
+    return doc.get("runs", {})
+
+def current_sketches(metric: str = "full_te") -> dict:
+    """(csp, wilaya) → (n, bin counts) of every current sketch document"""
+    key = METRICS[metric]
+    runs = current_runs()
+    if not runs:
+        return {}
+    sketches = {}
+    query = {"$or": [{"run": run, "csp": c, "p": None} for c, run in runs.items()]}
+    for doc in db[SKETCH_COLLECTION].find(query, {"csp": 1, "w": 1, "n": 1, f"bins.{key}": 1}):
+        counts = np.zeros(N_BINS, dtype=np.int64)
+        for b, n in doc.get("bins", {}).get(key, {}).items():
+            counts[int(b)] += n
+        sketches[(doc["csp"], doc.get("w"))] = (doc.get("n", 0), counts)
+    return sketches
+
+def load_sketch(metric: str = "full_te", csp: str = None, wilaya: str = None) -> np.ndarray:
+    """Merged bin counts (length N_BINS) of the current sketches matching csp / wilaya"""
+    key = METRICS[metric]
+    runs = current_runs()
+    if csp is not None:
+        runs = {csp: runs[csp]} if csp in runs else {}
+    counts = np.zeros(N_BINS, dtype=np.int64)
+    if not runs:
+        return counts
+
+    query = {"$or": [{"run": run, "csp": c, "p": None} for c, run in runs.items()]}
+    if wilaya is not None:
+        query["w"] = wilaya
+    for doc in db[SKETCH_COLLECTION].find(query, {f"bins.{key}": 1}):
+        for b, n in doc.get("bins", {}).get(key, {}).items():
+            counts[int(b)] += n
+    return counts
+
+def rank_in(counts: np.ndarray, value: float):
+    """Mid-rank percentile (0-100) of value in a bin-count array; None if empty"""
+    total = counts.sum()
+    if total == 0:
+        return None
+    b = bin_of(value)
+    below = counts[:b].sum()
+    return round(100.0 * (below + counts[b] / 2) / total, 1)
+
+def quantile_in(counts: np.ndarray, q: float):
+    """Smallest score whose cumulative share reaches q (0-1); None if empty"""
+    total = counts.sum()
+    if total == 0:
+        return None
+    b = int(np.searchsorted(np.cumsum(counts), q * total, side="left"))
+    return round(min(b, N_BINS - 1) * RESOLUTION, 1)
+
+def percentile_rank(value: float, metric: str = "full_te", csp: str = None, wilaya: str = None):
+    return rank_in(load_sketch(metric, csp, wilaya), value)
+
+def quantiles(qs=(0.1, 0.25, 0.5, 0.75, 0.9), metric: str = "full_te", csp: str = None, wilaya: str = None) -> dict:
+    counts = load_sketch(metric, csp, wilaya)
+    return {f"p{int(q * 100)}": quantile_in(counts, q) for q in qs}
+
+def classify_percentile(percentile) -> str:
+    if percentile is None:
+        return None
+    for cut, label in PERCENTILE_CUTS:
+        if percentile >= cut:
+            return label
+    return "Employabilité nulle"
+
+# ────────────────────────────────────────────────
+# CACHE for scoring (full_te per CSP, same refresh cadence as the tables)
+# ────────────────────────────────────────────────
+
+_te_counts = None
+_loaded_at = 0.0
+
+def te_percentile(csp: str, full_te: float):
+    """Rank of full_te within its CSP in the last published distribution (cached)"""
+    global _te_counts, _loaded_at
+    if _te_counts is None or time.monotonic() - _loaded_at > REFRESH_INTERVAL_S:
+        _te_counts = {c: load_sketch("full_te", c) for c in get_tables()["csp_categories"]}
+        _loaded_at = time.monotonic()
+    counts = _te_counts.get(csp)
+    return rank_in(counts, full_te) if counts is not None else None
+
+
+if __name__ == "__main__":
+    import sys
+    csps = sys.argv[1:] or get_tables()["csp_categories"]
+    for csp in csps:
+        print(f"{csp}: " + ", ".join(f"{k}={v}" for k, v in quantiles(csp=csp).items()))
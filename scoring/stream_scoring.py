@@ -0,0 +1,223 @@
+
+"""
+Offline scoring of profil exports (JSONL / NDJSON, optionally .gz) without
+importing them into MongoDB.
+Run:
+  python -m scoring.stream_scoring snapshot snapshot.json
+  python -m scoring.stream_scoring score export.jsonl.gz scores.jsonl --snapshot snapshot.json
+                                         [--chunk-size 5000] [--processes 4]
+
+The snapshot (taken once, online) freezes what scoring reads from the
+database: scoring tables, market score per CSP and the published full_te
+sketches (percentiles). Scoring then only needs the snapshot: lines are read
+lazily, scored chunk by chunk with score_resources / combine_te and streamed
+to JSONL (.gz allowed) or Parquet. At most 2 × processes chunks are in flight,
+so memory does not depend on the size of the export. No MongoDB connection is
+opened while scoring (pymongo connects lazily, on first use).
+"""
+
+from .resource_score import score_resources
+from .full_te import combine_te
+from .market_score import compute_market_score
+from .tables import get_tables, thaw
+from .score_sketches import load_sketch, rank_in, N_BINS
+from datetime import datetime, timezone
+from collections import deque
+from itertools import islice
+import numpy as np
+import argparse
+import gzip
+import json
+import multiprocessing
+import time
+
+try:  # fast parser when available
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+CHUNK_SIZE = 5000
+
+# ────────────────────────────────────────────────
+# SNAPSHOT (the only online step)
+# ────────────────────────────────────────────────
+
+def export_snapshot(path: str) -> dict:
+    tables = get_tables()
+    snapshot = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": thaw(tables),
+        "market": {csp: compute_market_score(csp) for csp in tables["csp_categories"]},
+        "te_sketches": {
+            csp: {str(b): int(n) for b, n in enumerate(load_sketch("full_te", csp)) if n}
+            for csp in tables["csp_categories"]
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=1)
+    print(f"✓ Snapshot v{tables['version']} écrit dans {path}")
+    return snapshot
+
+def load_snapshot(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# ────────────────────────────────────────────────
+# READ / SCORE
+# ────────────────────────────────────────────────
+
+def open_text(path: str, mode: str = "rt"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def read_lines(path: str):
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+def chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+_snapshot = None
+_sketches = None
+
+def init_worker(snapshot: dict):
+    global _snapshot, _sketches
+    _snapshot = snapshot
+    _sketches = {}
+    for csp, bins in snapshot.get("te_sketches", {}).items():
+        counts = np.zeros(N_BINS, dtype=np.int64)
+        for b, n in bins.items():
+            counts[int(b)] = n
+        _sketches[csp] = counts
+
+def snapshot_rank(csp: str, full_te: float):
+    counts = _sketches.get(csp)
+    return rank_in(counts, full_te) if counts is not None else None
+
+def score_chunk(lines: list):
+    """Decode and score one chunk of raw lines → (results, errors)"""
+    tables, market = _snapshot["tables"], _snapshot["market"]
+    results, errors = [], 0
+    for line in lines:
+        try:
+            profil = loads(line)
+        except ValueError:
+            errors += 1
+            continue
+        if not isinstance(profil, dict):  # valid JSON but not a profil (list, number, string...)
+            errors += 1
+            continue
+        try:
+            res = score_resources(profil, tables)
+            if "error" in res or "error" in market.get(res["csp"], {"error": 1}):
+                errors += 1
+                continue
+            results.append(combine_te(profil.get("id_demandeur"), res, market[res["csp"]], tables, snapshot_rank))
+        except (TypeError, AttributeError, KeyError, ValueError):  # malformed field: reject the line, not the run
+            errors += 1
+    return results, errors
+
+def scored_chunks(path: str, snapshot: dict, chunk_size: int = CHUNK_SIZE, processes: int = 1):
+    """Yield (results, errors) per chunk, in input order"""
+    if processes <= 1:
+        init_worker(snapshot)
+        for chunk in chunks(read_lines(path), chunk_size):
+            yield score_chunk(chunk)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes, initializer=init_worker, initargs=(snapshot,)) as pool:
+        pending = deque()
+        for chunk in chunks(read_lines(path), chunk_size):
+            pending.append(pool.apply_async(score_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:  # bounded: don't read ahead of the workers
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+# ────────────────────────────────────────────────
+# WRITE
+# ────────────────────────────────────────────────
+
+def write_jsonl(path: str, batches):
+    with open_text(path, "wt") as f:
+        for results in batches:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+
+def parquet_schema():
+    """Columns of combine_te() results, fixed so that no chunk decides the types"""
+    import pyarrow as pa
+    return pa.schema([
+        ("profil_id", pa.string()),
+        ("csp", pa.string()),
+        ("wilaya", pa.string()),
+        ("savoir_norm", pa.float64()),
+        ("savoir_faire_norm", pa.float64()),
+        ("savoir_etre_norm", pa.float64()),
+        ("weights_version", pa.int64()),
+        ("resources_score", pa.float64()),
+        ("market_score", pa.float64()),
+        ("full_te", pa.float64()),
+        ("classification", pa.string()),
+        ("percentile", pa.float64()),
+        ("classification_pct", pa.string()),
+    ])
+
+def write_parquet(path: str, batches):
+    """One row group per chunk (pyarrow required)"""
+    import pyarrow as pa  # optional dependency, only for .parquet outputs
+    import pyarrow.parquet as pq
+    schema = parquet_schema()
+    with pq.ParquetWriter(path, schema) as writer:
+        for results in batches:
+            if results:
+                writer.write_table(pa.Table.from_pylist(results, schema=schema))
+
+def score_file(in_path: str, out_path: str, snapshot: dict, chunk_size: int = CHUNK_SIZE, processes: int = 1) -> dict:
+    stats = {"scored": 0, "errors": 0}
+    t0 = time.perf_counter()
+
+    def batches():
+        for i, (results, errors) in enumerate(scored_chunks(in_path, snapshot, chunk_size, processes), 1):
+            stats["scored"] += len(results)
+            stats["errors"] += errors
+            rate = (stats["scored"] + stats["errors"]) / max(time.perf_counter() - t0, 1e-9)
+            print(f"Chunk {i}: {stats['scored']} profils scorés, {stats['errors']} rejetés ({rate:.0f} profils/s)")
+            yield results
+
+    write = write_parquet if out_path.endswith(".parquet") else write_jsonl
+    write(out_path, batches())
+
+    elapsed = time.perf_counter() - t0
+    stats["seconds"] = round(elapsed, 1)
+    stats["profiles_per_s"] = round((stats["scored"] + stats["errors"]) / max(elapsed, 1e-9))
+    print(f"Terminé: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline scoring of JSONL profil exports")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snap = sub.add_parser("snapshot", help="freeze tables + market scores (reads MongoDB)")
+    snap.add_argument("path")
+    score = sub.add_parser("score", help="score a JSONL / NDJSON export (no MongoDB)")
+    score.add_argument("input")
+    score.add_argument("output", help=".jsonl, .jsonl.gz or .parquet")
+    score.add_argument("--snapshot", required=True)
+    score.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    score.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        export_snapshot(args.path)
+    else:
+        score_file(args.input, args.output, load_snapshot(args.snapshot), args.chunk_size, args.processes)
@@ -0,0 +1,293 @@
+
+"""
+Scoring tables (savoir scores/bonus, CSP weights, CSP list) loaded from
+referentiels into an in-process, immutable, version-stamped cache.
+
+- niveau_etude entries (table="scoring"): libelle, score_base, score_bonus
+- csp entries (table="scoring"): libelle, ordre, weights_resources,
+  weights_res_market, weights_market
+- {"type": "version", "code": "scoring_tables"}: version counter + CSPs
+  waiting for a targeted rescore (rescore_csp)
+- dynamic_weights (active=True): Savoir/Savoir-faire/Savoir-être weights published
+  by the weighting agent, versioned per CSP; they override weights_resources and
+  their version is exposed in weight_versions (0 = referentiel weights)
+
+get_tables() serves the cached tables and re-checks the version at most once
+every REFRESH_INTERVAL_S; batch jobs call refresh_tables() once per page.
+Run: python -m scoring.tables seed   (write DEFAULT_TABLES into referentiels)
+"""
+
+from pymongo import MongoClient, DESCENDING
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+from types import MappingProxyType
+import os
+import time
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+VERSION_KEY = {"type": "version", "code": "scoring_tables"}
+REFRESH_INTERVAL_S = 60
+
+# Fallback + seed values (from the Excel grid)
+DEFAULT_TABLES = {
+    "csp_categories": ["Management", "Personnel professionnel", "Encadrement de support", "Personnel d'aide"],
+    "savoir_scores": {
+        "Sans diplôme": 0,
+        "Diplôme FP NIVEAU 1": 2,
+        "Diplôme FP NIVEAU 2": 3,
+        "Diplôme FP NIVEAU 3": 4,
+        "Diplôme BAC +3": 6,
+        "Diplôme Bac +5": 8,
+        "Diplôme Bac +7 et plus": 10,
+    },
+    "savoir_bonus": {
+        "Diplôme FP NIVEAU 1": 1,
+        "Diplôme FP NIVEAU 2": 1,
+        "Diplôme FP NIVEAU 3": 2,
+        "Diplôme BAC +3": 2,
+        "Diplôme Bac +5": 3,
+        "Diplôme Bac +7 et plus": 3,
+    },
+    "weights_resources": {
+        "Management": {"savoir": 45, "savoir_faire": 30, "savoir_etre": 25},
+        "Personnel professionnel": {"savoir": 33, "savoir_faire": 50, "savoir_etre": 17},
+        "Encadrement de support": {"savoir": 34, "savoir_faire": 33, "savoir_etre": 33},
+        "Personnel d'aide": {"savoir": 0, "savoir_faire": 100, "savoir_etre": 0},
+    },
+    "weights_res_market": {
+        "Management": {"resources": 80, "market": 20},
+        "Personnel professionnel": {"resources": 50, "market": 50},
+        "Encadrement de support": {"resources": 40, "market": 60},
+        "Personnel d'aide": {"resources": 10, "market": 90},
+    },
+    "weights_market": {
+        "Management": {"tension": 0.7, "duree": 0.3},
+        "Personnel professionnel": {"tension": 0.5, "duree": 0.5},
+        "Encadrement de support": {"tension": 0.6, "duree": 0.4},
+        "Personnel d'aide": {"tension": 0.3, "duree": 0.7},
+    },
+}
+
+CSP_WEIGHT_TABLES = ["weights_resources", "weights_res_market", "weights_market"]
+
+_tables = None
+_checked_at = 0.0
+
+# ────────────────────────────────────────────────
+# LOAD / CACHE
+# ────────────────────────────────────────────────
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """Plain dicts / lists from frozen tables (JSON export)"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+def current_version() -> int:
+    doc = db.referentiels.find_one(VERSION_KEY, {"version": 1})
+    return doc["version"] if doc else 0
+
+def load_tables():
+    """Read the scoring tables from referentiels (missing parts fall back to DEFAULT_TABLES)"""
+    version = current_version()
+    docs = list(db.referentiels.find({"type": {"$in": ["niveau_etude", "csp"]}, "table": "scoring"}))
+    niveaux = [d for d in docs if d["type"] == "niveau_etude"]
+    csps = sorted((d for d in docs if d["type"] == "csp"), key=lambda d: d.get("ordre", 0))
+
+    tables = {"version": version}
+    if niveaux:
+        tables["savoir_scores"] = {d["libelle"]: d["score_base"] for d in niveaux}
+        tables["savoir_bonus"] = {d["libelle"]: d["score_bonus"] for d in niveaux if d.get("score_bonus")}
+    else:
+        print("⚠ Aucun niveau_etude de scoring dans referentiels — tables par défaut")
+        tables["savoir_scores"] = DEFAULT_TABLES["savoir_scores"]
+        tables["savoir_bonus"] = DEFAULT_TABLES["savoir_bonus"]
+
+    if csps:
+        tables["csp_categories"] = [d["libelle"] for d in csps]
+        for name in CSP_WEIGHT_TABLES:
+            tables[name] = {d["libelle"]: d[name] for d in csps}
+    else:
+        print("⚠ Aucune CSP de scoring dans referentiels — poids par défaut")
+        tables["csp_categories"] = DEFAULT_TABLES["csp_categories"]
+        for name in CSP_WEIGHT_TABLES:
+            tables[name] = DEFAULT_TABLES[name]
+
+    # Dynamic weights published by agents/weighting_agent.py
+    active = {d["csp"]: d for d in db.dynamic_weights.find({"active": True})}
+    tables["referentiel_weights_resources"] = tables["weights_resources"]
+    tables["weights_resources"] = {
+        **tables["weights_resources"],
+        **{csp: d["weights"] for csp, d in active.items()},
+    }
+    tables["weight_versions"] = {csp: active[csp]["version"] if csp in active else 0
+                                 for csp in tables["csp_categories"]}
+
+    return _freeze(tables)
+
+def refresh_tables(force: bool = False) -> bool:
+    """One version check; reloads the tables only if they changed. Returns True on reload."""
+    global _tables, _checked_at
+    _checked_at = time.monotonic()
+    if not force and _tables is not None and current_version() == _tables["version"]:
+        return False
+    _tables = load_tables()
+    return True
+
+def get_tables():
+    """Cached tables (immutable mappings); version re-checked at most every REFRESH_INTERVAL_S"""
+    if _tables is None or time.monotonic() - _checked_at > REFRESH_INTERVAL_S:
+        refresh_tables()
+    return _tables
+
+# ────────────────────────────────────────────────
+# CHANGES → targeted rescoring
+# ────────────────────────────────────────────────
+
+def affected_csps(old, new) -> list:
+    """CSPs whose scores change between two versions of the tables"""
+    affected = set()
+    for csp in new["csp_categories"]:
+        if any(old[name].get(csp) != new[name].get(csp) for name in CSP_WEIGHT_TABLES):
+            affected.add(csp)
+
+    savoir_changed = (
+        old["savoir_scores"] != new["savoir_scores"] or old["savoir_bonus"] != new["savoir_bonus"]
+    )
+    if savoir_changed:
+        # only CSPs where the savoir pillar actually weighs something
+        affected |= {
+            csp for csp in new["csp_categories"]
+            if new["weights_resources"][csp]["savoir"] or old["weights_resources"].get(csp, {}).get("savoir")
+        }
+    return sorted(affected)
+
+def _apply_change(write):
+    old = load_tables()
+    write()
+    affected = affected_csps(old, load_tables())
+    db.referentiels.update_one(
+        VERSION_KEY,
+        {
+            "$inc": {"version": 1},
+            "$addToSet": {"rescore_csp": {"$each": affected}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        upsert=True
+    )
+    refresh_tables(force=True)
+    return affected
+
+def update_niveau_score(libelle: str, score_base: float = None, score_bonus: float = None) -> list:
+    fields = {k: v for k, v in {"score_base": score_base, "score_bonus": score_bonus}.items() if v is not None}
+    return _apply_change(lambda: db.referentiels.update_one(
+        {"type": "niveau_etude", "table": "scoring", "libelle": libelle}, {"$set": fields}
+    ))
+
+def update_csp_weights(csp: str, **weights) -> list:
+    """weights: weights_resources / weights_res_market / weights_market dicts"""
+    unknown = set(weights) - set(CSP_WEIGHT_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown weight tables: {sorted(unknown)}")
+    return _apply_change(lambda: db.referentiels.update_one(
+        {"type": "csp", "table": "scoring", "libelle": csp}, {"$set": weights}
+    ))
+
+def publish_dynamic_weights(csp: str, weights: dict, **meta):
+    """
+    Store a new active version of the CSP's dynamic weights (previous one
+    deactivated), bump the tables version and queue the CSP for rescoring.
+    Returns the new version number, or None when the weights equal the
+    active ones (nothing is published, nothing is rescored).
+    """
+    active = db.dynamic_weights.find_one({"csp": csp, "active": True}, {"weights": 1})
+    if active and active["weights"] == weights:
+        return None
+    last = db.dynamic_weights.find_one({"csp": csp}, sort=[("version", DESCENDING)])
+    version = (last["version"] if last else 0) + 1
+
+    def write():
+        db.dynamic_weights.insert_one({
+            "csp": csp,
+            "version": version,
+            "weights": weights,
+            "active": True,
+            "created_at": datetime.now(timezone.utc),
+            **meta,
+        })
+        db.dynamic_weights.update_many(
+            {"csp": csp, "active": True, "version": {"$ne": version}},
+            {"$set": {"active": False}}
+        )
+
+    _apply_change(write)
+    return version
+
+def pending_rescore() -> list:
+    doc = db.referentiels.find_one(VERSION_KEY, {"rescore_csp": 1}) or {}
+    return doc.get("rescore_csp", [])
+
+def clear_pending_rescore(csps: list):
+    db.referentiels.update_one(VERSION_KEY, {"$pullAll": {"rescore_csp": list(csps)}})
+
+# ────────────────────────────────────────────────
+# SEED
+# ────────────────────────────────────────────────
+
+def seed_scoring_referentiels(tables=DEFAULT_TABLES):
+    """Upsert the canonical scoring entries (fixed codes) into referentiels"""
+    now = datetime.now(timezone.utc)
+    for i, (libelle, score) in enumerate(tables["savoir_scores"].items()):
+        db.referentiels.update_one(
+            {"type": "niveau_etude", "code": f"NIV-{i:02d}"},
+            {"$set": {
+                "libelle": libelle,
+                "table": "scoring",
+                "score_base": score,
+                "score_bonus": tables["savoir_bonus"].get(libelle, 0),
+                "created_at": now,
+            }},
+            upsert=True
+        )
+    for i, csp in enumerate(tables["csp_categories"]):
+        db.referentiels.update_one(
+            {"type": "csp", "code": f"CSP-{i + 1:02d}"},
+            {"$set": {
+                "libelle": csp,
+                "table": "scoring",
+                "ordre": i,
+                **{name: tables[name][csp] for name in CSP_WEIGHT_TABLES},
+                "created_at": now,
+            }},
+            upsert=True
+        )
+    db.referentiels.update_one(
+        VERSION_KEY,
+        {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+        upsert=True
+    )
+    refresh_tables(force=True)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "seed":
+        seed_scoring_referentiels()
+        print("✓ Tables de scoring écrites dans referentiels")
+    tables = get_tables()
+    print(f"Tables de scoring v{tables['version']}:")
+    for csp in tables["csp_categories"]:
+        print(f"  {csp}: {dict(tables['weights_resources'][csp])}")
+    print(f"  CSP à rescorer: {pending_rescore()}")
@@ -0,0 +1,317 @@
+"""
+Distributed batch scoring: coordinator + workers sharing a scoring_jobs queue.
+Run:
+  python -m scoring.work_queue plan [--unit-size 5000] [--csp "Management" ...]
+  python -m scoring.work_queue work [JOB_ID] [--processes 4]
+  python -m scoring.work_queue status [JOB_ID]
+  python -m scoring.work_queue retry [JOB_ID]
+
+The coordinator splits profils into _id-range work units. Workers (any number,
+on any node) claim a unit with a lease-based find_one_and_update, score it page
+by page (bulk writes, as in batch_scoring), store the page's quantile sketch
+(keyed by the page, so a page scored twice is counted once) and heartbeat,
+which also checkpoints the unit. A unit whose lease expires (worker died) is
+claimed again by the next worker and resumes from its checkpoint. A unit
+whose lease expires MAX_ATTEMPTS times is marked failed, and so is its job
+once no unit is left to run; `retry` requeues the failed units (from their
+checkpoint, with fresh attempts) and reopens the job.
+"""
+
+from .batch_scoring import score_page, rebuild_prototypes, PAGE_FIELDS
+from .full_te import save_scores
+from .score_history import downsample_history
+from .tables import refresh_tables, pending_rescore, clear_pending_rescore
+from .dashboard_summary import refresh_dashboard_summary
+from .market_counters import reconcile_counters
+from .score_sketches import add_to_sketches, publish_sketches
+from pymongo import MongoClient, ReturnDocument
+from dotenv import load_dotenv
+from datetime import datetime, timezone, timedelta
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+
+load_dotenv()
+client = MongoClient(os.getenv("MONGODB_URI"))
+db = client[os.getenv("DATABASE_NAME")]
+
+UNIT_SIZE = 5000
+PAGE_SIZE = 500
+LEASE_S = 120           # a unit is reclaimable LEASE_S after its last heartbeat
+MAX_ATTEMPTS = 5
+IDLE_POLL_S = 10        # wait before re-checking units leased by other workers
+
+def now():
+    return datetime.now(timezone.utc)
+
+# ────────────────────────────────────────────────
+# COORDINATOR
+# ────────────────────────────────────────────────
+
+def plan_job(unit_size: int = UNIT_SIZE, csps: list = None) -> str:
+    """Split profils into _id ranges of ~unit_size documents (one pass over the _id index)"""
+    job_id = uuid.uuid4().hex[:12]
+    reconcile_counters()
+    query = {"csp": {"$in": csps}} if csps else {}
+
+    bounds = []
+    cursor = db.profils.find(query, {"_id": 1}).sort("_id", 1).batch_size(10000)
+    for i, doc in enumerate(cursor):
+        if i % unit_size == 0:
+            bounds.append(doc["_id"])
+
+    units = [
+        {
+            "_id": f"{job_id}:{seq:06d}",
+            "kind": "unit",
+            "job_id": job_id,
+            "seq": seq,
+            "min_id": lower,
+            "max_id": bounds[seq + 1] if seq + 1 < len(bounds) else None,  # exclusive
+            "status": "pending",
+            "attempts": 0,
+            "last_id": None,
+            "scored": 0,
+            "errors": 0,
+        }
+        for seq, lower in enumerate(bounds)
+    ]
+    db.scoring_jobs.insert_one({
+        "_id": job_id,
+        "kind": "job",
+        "status": "running",
+        "csps": csps,
+        "clears_pending": csps or pending_rescore(),
+        "units": len(units),
+        "unit_size": unit_size,
+        "created_at": now(),
+    })
+    if units:
+        db.scoring_jobs.insert_many(units, ordered=False)
+    print(f"Job {job_id}: {len(units)} unités de ~{unit_size} profils")
+    return job_id
+
+def latest_job_id():
+    job = db.scoring_jobs.find_one({"kind": "job"}, sort=[("created_at", -1)])
+    return job["_id"] if job else None
+
+def job_progress(job_id: str) -> dict:
+    job = db.scoring_jobs.find_one({"_id": job_id})
+    if not job:
+        return {"error": f"Unknown job: {job_id}"}
+    by_status = {
+        r["_id"]: r for r in db.scoring_jobs.aggregate([
+            {"$match": {"job_id": job_id, "kind": "unit"}},
+            {"$group": {
+                "_id": "$status",
+                "units": {"$sum": 1},
+                "scored": {"$sum": "$scored"},
+                "errors": {"$sum": "$errors"},
+            }}
+        ])
+    }
+    done = by_status.get("done", {}).get("units", 0)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "units": job["units"],
+        "units_by_status": {s: r["units"] for s, r in by_status.items()},
+        "scored": sum(r["scored"] for r in by_status.values()),
+        "errors": sum(r["errors"] for r in by_status.values()),
+        "progress": round(100.0 * done / job["units"], 1) if job["units"] else 100.0,
+        "workers": db.scoring_jobs.distinct(
+            "lease_owner", {"job_id": job_id, "status": "leased", "lease_expires": {"$gt": now()}}
+        ),
+    }
+
+def retry_job(job_id: str) -> int:
+    """Requeue the failed units of a job (checkpoints kept, attempts reset) and reopen it"""
+    requeued = db.scoring_jobs.update_many(
+        {"job_id": job_id, "kind": "unit", "status": "failed"},
+        {"$set": {"status": "pending", "attempts": 0}, "$unset": {"lease_owner": "", "failed_at": ""}},
+    ).modified_count
+    if requeued:
+        db.scoring_jobs.update_one(
+            {"_id": job_id, "status": "failed"},
+            {"$set": {"status": "running"}, "$unset": {"failed_at": ""}},
+        )
+    print(f"Job {job_id}: {requeued} unités remises en file")
+    return requeued
+
+# ────────────────────────────────────────────────
+# WORKER
+# ────────────────────────────────────────────────
+
+def claim_unit(job_id: str, worker_id: str):
+    """Atomically lease the next pending unit, or one whose lease expired"""
+    t = now()
+    return db.scoring_jobs.find_one_and_update(
+        {
+            "job_id": job_id,
+            "kind": "unit",
+            "attempts": {"$lt": MAX_ATTEMPTS},
+            "$or": [
+                {"status": "pending"},
+                {"status": "leased", "lease_expires": {"$lt": t}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "leased",
+                "lease_owner": worker_id,
+                "lease_expires": t + timedelta(seconds=LEASE_S),
+                "heartbeat_at": t,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("seq", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+def heartbeat(unit: dict, worker_id: str, **checkpoint) -> bool:
+    """Extend the lease and checkpoint the unit; False if another worker took it over"""
+    t = now()
+    result = db.scoring_jobs.update_one(
+        {"_id": unit["_id"], "lease_owner": worker_id, "status": "leased"},
+        {"$set": {"lease_expires": t + timedelta(seconds=LEASE_S), "heartbeat_at": t, **checkpoint}},
+    )
+    return result.modified_count == 1
+
+def process_unit(unit: dict, worker_id: str, csps: list, market_scores: dict) -> bool:
+    base_query = {"_id": {"$gte": unit["min_id"]}}
+    if unit["max_id"] is not None:
+        base_query["_id"]["$lt"] = unit["max_id"]
+    if csps:
+        base_query["csp"] = {"$in": csps}
+
+    last_id, scored, errors = unit.get("last_id"), unit.get("scored", 0), unit.get("errors", 0)
+    while True:
+        if refresh_tables():
+            market_scores.clear()
+        query = dict(base_query)
+        if last_id is not None:
+            query["_id"] = {**query["_id"], "$gt": last_id}
+        page = list(db.profils.find(query, PAGE_FIELDS).sort("_id", 1).limit(PAGE_SIZE))
+        if not page:
+            break
+
+        results, previous_te, page_errors = score_page(page, market_scores)
+        save_scores(results, previous_te)
+        add_to_sketches(unit["job_id"], results, page[0]["_id"])
+        last_id, scored, errors = page[-1]["_id"], scored + len(results), errors + page_errors
+        if not heartbeat(unit, worker_id, last_id=last_id, scored=scored, errors=errors):
+            print(f"[{worker_id}] bail perdu sur {unit['_id']} — unité abandonnée")
+            return False
+
+    return db.scoring_jobs.update_one(
+        {"_id": unit["_id"], "lease_owner": worker_id, "status": "leased"},
+        {"$set": {"status": "done", "done_at": now()}, "$unset": {"lease_expires": ""}},
+    ).modified_count == 1
+
+def fail_exhausted_units(job_id: str) -> int:
+    """Units whose last allowed lease expired: failed (claim_unit never takes them again)"""
+    return db.scoring_jobs.update_many(
+        {
+            "job_id": job_id, "kind": "unit", "status": "leased",
+            "attempts": {"$gte": MAX_ATTEMPTS}, "lease_expires": {"$lt": now()},
+        },
+        {"$set": {"status": "failed", "failed_at": now()}, "$unset": {"lease_expires": ""}},
+    ).modified_count
+
+def fail_job(job_id: str):
+    job = db.scoring_jobs.find_one_and_update(
+        {"_id": job_id, "status": "running"},
+        {"$set": {"status": "failed", "failed_at": now()}},
+    )
+    if job:
+        print(f"Job {job_id} en échec — relancer les unités: python -m scoring.work_queue retry {job_id}")
+
+def finalize_job(job_id: str):
+    """Run once, by the worker that sees the last unit done"""
+    job = db.scoring_jobs.find_one_and_update(
+        {"_id": job_id, "status": "running"},
+        {"$set": {"status": "done", "finished_at": now()}},
+    )
+    if not job:
+        return
+    clear_pending_rescore(job.get("clears_pending", []))
+    publish_sketches(job_id, job.get("csps"))
+    rebuild_prototypes()
+    downsample_history()
+    refresh_dashboard_summary()
+    print(f"Job {job_id} terminé.")
+
+def run_worker(job_id: str, worker_id: str = None):
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    job = db.scoring_jobs.find_one({"_id": job_id})
+    if not job:
+        print(f"Job inconnu: {job_id}")
+        return
+    market_scores = {}
+
+    while True:
+        unit = claim_unit(job_id, worker_id)
+        if unit:
+            t0 = time.perf_counter()
+            if process_unit(unit, worker_id, job.get("csps"), market_scores):
+                print(f"[{worker_id}] {unit['_id']} ok en {time.perf_counter() - t0:.1f}s")
+            continue
+
+        # nothing claimable: finished, or other workers still hold live leases
+        fail_exhausted_units(job_id)
+        remaining = db.scoring_jobs.count_documents({
+            "job_id": job_id, "kind": "unit", "status": {"$in": ["pending", "leased"]},
+        })
+        if remaining == 0:
+            failed = db.scoring_jobs.count_documents({"job_id": job_id, "kind": "unit", "status": "failed"})
+            if failed:
+                print(f"[{worker_id}] {failed} unités abandonnées après {MAX_ATTEMPTS} tentatives")
+                fail_job(job_id)
+            else:
+                finalize_job(job_id)
+            return
+        time.sleep(IDLE_POLL_S)
+
+def run_local_workers(job_id: str, processes: int):
+    """Several worker processes on this machine (spawn: one MongoClient per process)"""
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=run_worker, args=(job_id, f"{socket.gethostname()}-w{i}"))
+        for i in range(processes)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed batch scoring")
+    sub = parser.add_subparsers(dest="command", required=True)
+    plan = sub.add_parser("plan", help="split profils into work units")
+    plan.add_argument("--unit-size", type=int, default=UNIT_SIZE)
+    plan.add_argument("--csp", action="append", help="restrict to these CSPs (repeatable)")
+    work = sub.add_parser("work", help="claim and score units")
+    work.add_argument("job_id", nargs="?")
+    work.add_argument("--processes", type=int, default=1)
+    status = sub.add_parser("status", help="progress of a job")
+    status.add_argument("job_id", nargs="?")
+    retry = sub.add_parser("retry", help="requeue the failed units of a job")
+    retry.add_argument("job_id", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan_job(args.unit_size, args.csp)
+    else:
+        job_id = args.job_id or latest_job_id()
+        if args.command == "status":
+            print(job_progress(job_id))
+        elif args.command == "retry":
+            retry_job(job_id)
+        elif args.processes > 1:
+            run_local_workers(job_id, args.processes)
+        else:
+            run_worker(job_id)